@@ -1,21 +1,52 @@
+import time
+
+_IMPORT_T0 = time.perf_counter()  # uppstartsrapport: tid för import av app.py
+
+import hashlib
+import hmac
+import itertools
 import json
 import math
 import os
 import re
-import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import click
 import requests
 from dotenv import load_dotenv
-from flask import Flask, flash, redirect, render_template, request, url_for
+from flask import Flask, Response, flash, g, jsonify, redirect, render_template, request, url_for
+from markupsafe import Markup
 from urllib.parse import urlparse, parse_qs, quote  # <-- inkluderar quote för URL-byggaren
 
+import bulk_io
+import deadline
+import diagnostics
+import quote_matrix
+import tenants
+from quote_journal import QuoteJournal
+from place_index import PlaceGrid, PlaceTrie, parse_latlng
+from travel_cache import TravelCache
 from sheets_repo import (
+    _norm,
+    _num,
+    _route_key,
     append_place,
+    append_places_bulk,
     append_route_with_prices,
+    append_routes_bulk,
     delete_place as sheets_delete_place,
     delete_route as sheets_delete_route,
+    diagnostic_probes as sheets_diagnostic_probes,
+    fill_missing_coordinates,
+    forget as sheets_forget,
     load_all as sheets_load_all,
+    parse_price_band,
+    prewarm as sheets_prewarm,
     update_place_latlng_by_title,
     update_route_row,
+    update_routes_travel_details,
 )
 
 # -----------------------------------------------------------------------------
@@ -72,9 +103,27 @@ API_KEY = os.getenv("GOOGLE_API_KEY")
 SETTINGS_FILE = "settings.json"
 
 
+# Token för admin-endpoints (t.ex. /diagnostics); tom = de är avstängda
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+def admin_authorized():
+    """Sant om requesten bär ADMIN_TOKEN (Authorization: Bearer … eller X-Admin-Token)."""
+    if not ADMIN_TOKEN:
+        return False
+    sent = request.headers.get("X-Admin-Token", "")
+    auth = request.headers.get("Authorization", "")
+    if not sent and auth.startswith("Bearer "):
+        sent = auth[len("Bearer "):].strip()
+    return hmac.compare_digest(sent.encode(), ADMIN_TOKEN.encode())
+
+# Endpoints vars URL innehåller tariff-/snapshot-version och därför får cachas
+CACHEABLE_ENDPOINTS = {"quote_view"}
+
 @app.after_request
 def add_no_store(resp):
-    """Disable browser/proxy caching så ändringar syns direkt."""
+    """Disable browser/proxy caching så ändringar syns direkt (utom versionerade offert-URL:er)."""
+    if request.endpoint in CACHEABLE_ENDPOINTS and resp.status_code in (200, 304):
+        return resp
     resp.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
     resp.headers["Pragma"] = "no-cache"
     resp.headers["Expires"] = "0"
@@ -83,9 +132,14 @@ def add_no_store(resp):
 # -----------------------------------------------------------------------------
 # Settings (tariffer lagras lokalt)
 # -----------------------------------------------------------------------------
+def settings_file():
+    """Aktuell tenants settings-fil (DEFAULT: settings.json, annars settings-<tenant>.json)."""
+    return tenants.config().get("settings_file") or tenants.per_tenant_path(SETTINGS_FILE)
+
 def load_settings():
-    if os.path.exists(SETTINGS_FILE):
-        with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
+    path = settings_file()
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
             return json.load(f)
     return {
         "tariffs": {
@@ -95,62 +149,292 @@ def load_settings():
     }
 
 def save_settings(data):
-    tmp = SETTINGS_FILE + ".tmp"
+    path = settings_file()
+    tmp = path + ".tmp"
     with open(tmp, "w", encoding="utf-8") as f:
         json.dump(data, f, indent=2, ensure_ascii=False)
-    os.replace(tmp, SETTINGS_FILE)
+    os.replace(tmp, path)
+
+def _settings_mtime():
+    try:
+        return os.stat(settings_file()).st_mtime_ns
+    except OSError:
+        return None
+
+def get_settings():
+    """
+    Tenantens settings, lästa vid första användning (inte vid import) och om igen när
+    filen ändrats – t.ex. sparad av en annan worker – så att alla workers räknar med
+    samma tariffer (och samma tariff_version i offert-URL:er).
+    """
+    state = tenant_state()
+    mtime = _settings_mtime()
+    if state.settings is None or mtime != state.settings_mtime:
+        state.settings = load_settings()
+        state.settings_mtime = mtime
+    return state.settings
+
+def get_user_tariffs():
+    return get_settings().get("tariffs", {})
+
+def get_fleet_limits():
+    """Valfritt tak för tillgängliga bilar: {"small": 10, "large": 4} (saknas/null = obegränsat)."""
+    return get_settings().get("fleet", {})
+
+# -----------------------------------------------------------------------------
+# Single-flight (samtidiga identiska anrop delar på ETT uppströmsanrop)
+# -----------------------------------------------------------------------------
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+_INFLIGHT = {}
+_INFLIGHT_LOCK = threading.Lock()
+
+def single_flight(key, fn, *args, **kwargs):
+    """
+    Kör fn(*args, **kwargs) högst en gång åt gången per nyckel.
+    Anrop som kommer in medan ett identiskt anrop pågår väntar och får
+    samma resultat (eller samma exception) i stället för att själva
+    gå mot Sheets/Google. Väntan avbryts med deadline.BudgetExceeded om
+    requestens tidsbudget tar slut.
+    """
+    with _INFLIGHT_LOCK:
+        flight = _INFLIGHT.get(key)
+        leader = flight is None
+        if leader:
+            flight = _Flight()
+            _INFLIGHT[key] = flight
+
+    if not leader:
+        # Väntaren har samma tidsbudget som requesten (ingen budget = vänta klart)
+        if not flight.done.wait(deadline.remaining()):
+            raise deadline.BudgetExceeded()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = fn(*args, **kwargs)
+        return flight.result
+    except BaseException as e:
+        flight.error = e
+        raise
+    finally:
+        with _INFLIGHT_LOCK:
+            _INFLIGHT.pop(key, None)
+        flight.done.set()
+
+# -----------------------------------------------------------------------------
+# Tenants (flera taxibolag – se tenants.py)
+# -----------------------------------------------------------------------------
+TRAVEL_CACHE_SIZE = int(os.getenv("TRAVEL_CACHE_SIZE", "5000") or 5000)
+TRAVEL_CACHE_TTL_S = float(os.getenv("TRAVEL_CACHE_TTL_H", "24") or 24) * 3600
+# Grova uppskattningar (bytes) per rad/post, inte uppmätta – de styr TenantLRU:s budget.
+# Jämför med verkligheten: `flask tenant-memory` (tracemalloc, inkl. sheets_repos
+# radindex och nyckelmängd som inte har egna termer här).
+PLACE_BYTES, ROUTE_BYTES, TRAVEL_BYTES, TENANT_BASE_BYTES = 7000, 1500, 400, 20000
+
+def _empty_sheets_cache():
+    return {
+        "routes": [], "places": [], "loaded_at": 0.0, "version": "",
+        # Läsgeneration: generation = senast begärda, loaded_generation = den som visas
+        "generation": 0, "loaded_generation": 0,
+        "bidirectional": [], "route_pairs": [],
+        "place_trie": PlaceTrie([]), "place_grid": PlaceGrid([]), "route_by_pair": {},
+    }
+
+class TenantState:
+    """Allt som cachas per taxibolag: snapshot + index, settings, restider, fragment, offertmatris."""
+    __slots__ = (
+        "tenant_id", "sheets", "settings", "settings_mtime", "travel", "fragments", "quote_matrix", "backfill",
+    )
+
+    def __init__(self, tenant_id):
+        self.tenant_id = tenant_id
+        self.sheets = _empty_sheets_cache()
+        self.settings = None
+        self.settings_mtime = None
+        # Restid/avstånd per normaliserat par (värms även från offertjournalen)
+        self.travel = TravelCache(maxsize=TRAVEL_CACHE_SIZE, ttl_s=TRAVEL_CACHE_TTL_S)
+        self.fragments = {"version": None, "items": {}}
+        self.quote_matrix = {"matrix": None, "mtime": None}
+        # Senaste koordinat-backfill (start_coordinate_backfill)
+        self.backfill = {"running": False, "summary": None, "error": None, "finished_at": None}
+
+    def size_bytes(self):
+        return (
+            TENANT_BASE_BYTES
+            + len(self.sheets["places"]) * PLACE_BYTES
+            + len(self.sheets["routes"]) * ROUTE_BYTES
+            + len(self.travel) * TRAVEL_BYTES
+            + sum(len(html) for html in self.fragments["items"].values())
+        )
 
-user_tariffs = load_settings().get("tariffs", {})
+def _forget_tenant(tenant_id, state):
+    sid = tenants.config(tenant_id).get("spreadsheet_id")
+    if sid:
+        sheets_forget(sid)
+
+TENANT_STATES = tenants.TenantLRU(
+    TenantState,
+    max_bytes=float(os.getenv("TENANT_CACHE_MAX_MB", "256") or 256) * 1024 * 1024,
+    idle_s=float(os.getenv("TENANT_IDLE_MIN", "30") or 30) * 60,
+    on_evict=_forget_tenant,
+)
+
+def tenant_state():
+    return TENANT_STATES.get(tenants.current())
+
+def sheets_cache():
+    """Aktuell tenants snapshot + index (det som tidigare var den globala SHEETS_CACHE)."""
+    return tenant_state().sheets
+
+def travel_cache():
+    return tenant_state().travel
+
+def bind_tenant(fn):
+    """fn som körs i aktuell tenant även i en annan tråd (contextvars följer inte med trådar)."""
+    tenant_id = tenants.current()
+
+    def run(*args, **kwargs):
+        with tenants.use(tenant_id):
+            return fn(*args, **kwargs)
+    return run
+
+def for_each_tenant(fn):
+    """Kör fn() en gång per konfigurerad tenant → {tenant: resultat} (bakgrundsjobb/CLI)."""
+    out = {}
+    for tenant_id in tenants.all_tenants():
+        with tenants.use(tenant_id):
+            try:
+                out[tenant_id] = fn()
+            except Exception as e:
+                print(f"⚠️ {getattr(fn, '__name__', 'jobb')} för {tenant_id} fel:", e)
+    return out
+
+@app.before_request
+def _activate_tenant():
+    tenant_id, source = tenants.resolve(
+        request.host, request.headers.get("X-Tenant", ""), request.args.get("tenant", ""),
+        allow_override=admin_authorized(),
+    )
+    if tenant_id is None:
+        if not admin_authorized():
+            return jsonify({"error": "Att välja tenant kräver admin-token."}), 403
+        return jsonify({"error": "Okänd tenant."}), 404
+    g.tenant_token = tenants.activate(tenant_id)
+    g.tenant_query = tenant_id if source == "query" else None
+    g.tenant_override = source in ("header", "query")
+
+@app.teardown_request
+def _deactivate_tenant(exc):
+    token = g.pop("tenant_token", None)
+    if token is not None:
+        tenants.deactivate(token)
+
+@app.url_defaults
+def _tenant_url_defaults(endpoint, values):
+    """Vald via ?tenant= → följer med i url_for (redirects, länkar, formulär)."""
+    if g.get("tenant_query") and endpoint != "static":
+        values.setdefault("tenant", g.tenant_query)
 
 # -----------------------------------------------------------------------------
 # Sheets-cache
 # -----------------------------------------------------------------------------
 def make_routes_bidirectional(routes):
-    """Returnera båda riktningar för varje fördefinierad rutt."""
+    """
+    Returnera båda riktningar för varje fördefinierad rutt.
+    Sparade rutter går före; motsatt riktning läggs bara till som vy (Route.reversed())
+    där ingen egen rutt finns – inga kopior av fält eller prislistor.
+    """
     out = []
     seen = set()
     for r in routes:
-        k1 = (r.get("from"), r.get("to"))
-        k2 = (r.get("to"), r.get("from"))
-        if k1 not in seen:
+        k = (r.get("from"), r.get("to"))
+        if k not in seen:
             out.append(r)
-            seen.add(k1)
-        if k2 not in seen:
-            out.append(
-                {
-                    **r,
-                    "route_id": r.get("route_id"),
-                    "from": r.get("to"),
-                    "to": r.get("from"),
-                    "from_address": r.get("to_address"),
-                    "to_address": r.get("from_address"),
-                }
-            )
-            seen.add(k2)
+            seen.add(k)
+    for r in routes:
+        k = (r.get("to"), r.get("from"))
+        if k not in seen:
+            out.append(r.reversed())
+            seen.add(k)
     return out
 
-SHEETS_CACHE = {"routes": [], "places": [], "loaded_at": 0.0}
 SHEETS_TTL = 0  # sek – 0 = alltid färskt från Sheets (bust vid POST)
 
+def snapshot_version(sdata) -> str:
+    """Kort innehållshash av en Sheets-snapshot – ändras bara när datat ändras."""
+    raw = json.dumps(
+        sdata, sort_keys=True, ensure_ascii=False,
+        default=lambda o: dict(o) if hasattr(o, "keys") else str(o),
+    )
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+# Generationer för Sheets-läsningar (delas av alla tenants, bara ökande)
+_SHEETS_GENERATION = itertools.count(1)
+
 def refresh_sheets_cache(force=False):
+    """
+    Läs om Sheets när TTL gått ut. force=True (efter en skrivning) startar alltid en
+    ny läsning med ny generation i single-flight-nyckeln – en läsning som redan pågår
+    kan ha börjat före skrivningen och får inte återanvändas.
+    """
     now = time.time()
-    if force or (now - SHEETS_CACHE["loaded_at"] > SHEETS_TTL) or not SHEETS_CACHE["routes"]:
+    cache = sheets_cache()
+    if force or (now - cache["loaded_at"] > SHEETS_TTL) or not cache["routes"]:
+        if force:
+            cache["generation"] = next(_SHEETS_GENERATION)
+        generation = cache["generation"]
         try:
-            sdata = sheets_load_all()
-            SHEETS_CACHE["routes"] = sdata["routes"]
-            SHEETS_CACHE["places"] = sdata.get("places", [])
-            SHEETS_CACHE["loaded_at"] = now
+            sdata = single_flight(("sheets_load_all", tenants.current(), generation), sheets_load_all)
+            if generation < cache["loaded_generation"]:
+                return  # en nyare läsning hann före – behåll den
+            cache["loaded_generation"] = generation
+            version = snapshot_version(sdata)
+            if version != cache["version"]:
+                # Snapshot + index byggs bara om när innehållet faktiskt ändrats;
+                # annars behålls de gamla (likadana) posterna och den nya läsningen släpps.
+                places = sdata.get("places", [])
+                bidirectional = make_routes_bidirectional(sdata["routes"])
+                cache.update({
+                    "routes": sdata["routes"],
+                    "places": places,
+                    "bidirectional": bidirectional,
+                    # Bara det index.html behöver för dropdowns (från/till)
+                    "route_pairs": [{"from": r["from"], "to": r["to"]} for r in bidirectional],
+                    "place_trie": PlaceTrie(places),
+                    "place_grid": PlaceGrid(places, radius_m=SNAP_RADIUS_M),
+                    "route_by_pair": {_route_key(r["from"], r["to"]): r for r in bidirectional},
+                    "version": version,
+                })
+            cache["loaded_at"] = now
         except Exception as e:
             print("⚠️ Sheets-läsfel:", e)
 
+def ensure_sheets_cache():
+    """Ladda Sheets om inget laddats än – för heta läsvägar (typeahead) som tål en äldre snapshot."""
+    if not sheets_cache()["loaded_at"]:
+        refresh_sheets_cache()
+
 def get_predefined_routes():
     refresh_sheets_cache()
-    return make_routes_bidirectional(SHEETS_CACHE["routes"])
+    return sheets_cache()["bidirectional"]
+
+def get_route_pairs():
+    """[{"from", "to"}] för båda riktningar – byggs en gång per snapshot."""
+    refresh_sheets_cache()
+    return sheets_cache()["route_pairs"]
 
 def get_address_titles_from_sheets():
     refresh_sheets_cache()
     out = []
-    for p in SHEETS_CACHE["places"]:
+    for p in sheets_cache()["places"]:
         out.append(
             {
                 "id": p.get("PlaceID", ""),
@@ -167,6 +451,7 @@ def get_address_titles_from_sheets():
 # -----------------------------------------------------------------------------
 def calculate_derived_tariffs():
     """Bas + härledda rabatt-tariffer — NYCKLARNA matchar övrig kod."""
+    user_tariffs = get_user_tariffs()
     t1 = user_tariffs.get("Taxa 1 (Småbil)", {"start": 0.0, "km": 0.0, "hour": 0.0})
     t2 = user_tariffs.get("Taxa 2 (Storbils)", {"start": 0.0, "km": 0.0, "hour": 0.0})
     return {
@@ -192,15 +477,42 @@ def calculate_derived_tariffs():
         },
     }
 
+def tariff_version() -> str:
+    """Kort hash av de härledda tarifferna – ändras när tarifferna sparas om."""
+    raw = json.dumps(calculate_derived_tariffs(), sort_keys=True)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
 # -----------------------------------------------------------------------------
 # Google APIs
 # -----------------------------------------------------------------------------
+MAPS_TIMEOUT_S = float(os.getenv("MAPS_TIMEOUT_S", "20") or 20)
+# Väntetid innan dubblettanrop när det ännu inte finns p95-statistik
+HEDGE_DEFAULT_S = float(os.getenv("MAPS_HEDGE_DEFAULT_S", "1.5") or 1.5)
+_MAPS_LATENCY = {}
+
+def maps_get_json(name, url, params):
+    """
+    GET mot Google Maps → JSON. Timeout = det som är kvar av requestens budget
+    (högst MAPS_TIMEOUT_S); dröjer svaret längre än endpointens p95 skickas ett dubblettanrop.
+    """
+    tracker = _MAPS_LATENCY.get(name)
+    if tracker is None:
+        tracker = _MAPS_LATENCY.setdefault(name, deadline.LatencyTracker())
+    t = deadline.timeout(MAPS_TIMEOUT_S)
+    return deadline.hedged(
+        lambda: requests.get(url, params=params, timeout=t).json(), tracker, t, HEDGE_DEFAULT_S
+    )
+
 def geocode_address(address: str = None, place_id: str = None):
     """
     Returnerar (lat, lng, formatted_address).
     - Om place_id finns: använd Places Details (säkrast).
     - Annars: använd Geocoding (adress-sträng) med SE/NO-bias.
+    Samtidiga identiska uppslag delar på ett anrop (single-flight).
     """
+    return single_flight(("geocode", address, place_id), _geocode_address, address, place_id)
+
+def _geocode_address(address, place_id):
     try:
         if place_id:
             url = "https://maps.googleapis.com/maps/api/place/details/json"
@@ -210,8 +522,7 @@ def geocode_address(address: str = None, place_id: str = None):
                 "language": "sv",
                 "key": API_KEY,
             }
-            resp = requests.get(url, params=params, timeout=20)
-            data = resp.json()
+            data = maps_get_json("place_details", url, params)
             if data.get("status") == "OK" and data.get("result"):
                 res = data["result"]
                 loc = res["geometry"]["location"]
@@ -227,8 +538,7 @@ def geocode_address(address: str = None, place_id: str = None):
                 "language": "sv",
                 "components": "country:SE|country:NO",
             }
-            resp = requests.get(url, params=params, timeout=20)
-            data = resp.json()
+            data = maps_get_json("geocode", url, params)
             if data.get("status") == "OK" and data["results"]:
                 res = data["results"][0]
                 loc = res["geometry"]["location"]
@@ -240,11 +550,45 @@ def geocode_address(address: str = None, place_id: str = None):
 
     return None, None, address or ""
 
-def get_travel_details(origin_param: str, destination_param: str):
+def get_travel_details(origin_param: str, destination_param: str, use_cache=True):
     """
     Directions via Google.
     origin_param/destination_param ska redan vara 'place_id:...' eller 'lat,lng'.
+    Samtidiga identiska uppslag delar på ett anrop (single-flight).
+    use_cache=False hoppar över travel_cache() vid läsning (resultatet sparas ändå).
+    """
+    key = (origin_param, destination_param)
+    if use_cache:
+        hit = travel_cache().get(key)
+        if hit:
+            return hit
+    try:
+        duration, distance = single_flight(
+            ("directions", origin_param, destination_param),
+            _get_travel_details, origin_param, destination_param,
+        )
+    except Exception as e:
+        print("⚠️ Directions fel:", type(e).__name__, e)
+        return None, None
+    travel_cache().put(key, duration, distance)
+    return duration, distance
+
+def get_travel_details_or_stale(origin_param, destination_param):
+    """
+    (duration_min, distance_km, stale_age_s). Misslyckas Directions (t.ex. budgeten
+    tog slut) används senast kända värde för paret även om TTL passerats –
+    stale_age_s anger då dess ålder, annars None.
     """
+    duration, distance = get_travel_details(origin_param, destination_param)
+    if duration and distance:
+        return duration, distance, None
+    stale = travel_cache().get_stale((origin_param, destination_param))
+    if stale:
+        print(f"⚠️ Directions utan svar – använder restid som är {stale[2] / 3600:.1f} h gammal.")
+        return stale
+    return None, None, None
+
+def _get_travel_details(origin_param, destination_param):
     url = "https://maps.googleapis.com/maps/api/directions/json"
     params = {
         "origin": origin_param,
@@ -252,8 +596,7 @@ def get_travel_details(origin_param: str, destination_param: str):
         "mode": "driving",
         "key": API_KEY,
     }
-    r = requests.get(url, params=params, timeout=20)
-    data = r.json()
+    data = maps_get_json("directions", url, params)
     try:
         if data.get("status") == "OK":
             leg = data["routes"][0]["legs"][0]
@@ -263,6 +606,67 @@ def get_travel_details(origin_param: str, destination_param: str):
         print("🚨 Tolkningsfel:", e)
     return None, None
 
+def get_travel_matrix(origins, destinations):
+    """
+    Distance Matrix via Google för flera par i ett anrop (max 100 element).
+    origins/destinations är listor med 'lat,lng'. Returnerar [[(min, km) | None]].
+    """
+    url = "https://maps.googleapis.com/maps/api/distancematrix/json"
+    params = {
+        "origins": "|".join(origins),
+        "destinations": "|".join(destinations),
+        "mode": "driving",
+        "key": API_KEY,
+    }
+    data = requests.get(url, params=params, timeout=20).json()
+    if data.get("status") != "OK":
+        print("⚠️ Distance Matrix status:", data.get("status"))
+        return []
+    out = []
+    for row in data.get("rows", []):
+        cells = []
+        for el in row.get("elements", []):
+            if el.get("status") == "OK":
+                cells.append((el["duration"]["value"] / 60.0, el["distance"]["value"] / 1000.0))
+            else:
+                cells.append(None)
+        out.append(cells)
+    return out
+
+def places_autocomplete(text: str, session_token: str = ""):
+    """
+    Google Places Autocomplete (server-side) med SE/NO-begränsning.
+    Returnerar [{"title", "address", "place_id"}]; används bara när inget lokalt matchar.
+    session_token (ett per skrivsession i webbläsaren) gör att Google debiterar
+    sessionen i stället för varje tangenttryckning. Token ingår i single-flight-nyckeln:
+    två användare med samma prefix får var sitt anrop i sin egen session.
+    """
+    return single_flight(("autocomplete", text, session_token), _places_autocomplete, text, session_token)
+
+def _places_autocomplete(text, session_token=""):
+    url = "https://maps.googleapis.com/maps/api/place/autocomplete/json"
+    params = {
+        "input": text,
+        "types": "geocode",
+        "components": "country:se|country:no",
+        "language": "sv",
+        "key": API_KEY,
+    }
+    if session_token:
+        params["sessiontoken"] = session_token
+    try:
+        data = maps_get_json("autocomplete", url, params)
+        if data.get("status") == "OK":
+            return [
+                {"title": p.get("description", ""), "address": p.get("description", ""), "place_id": p.get("place_id", "")}
+                for p in data.get("predictions", [])
+            ]
+        if data.get("status") != "ZERO_RESULTS":
+            print("⚠️ Autocomplete status:", data.get("status"))
+    except Exception as e:
+        print("⚠️ places_autocomplete fel:", e)
+    return []
+
 def generate_static_map_url(origin_param: str, destination_param: str):
     """Bygg Embed-URL för att visa rutten."""
     base = "https://www.google.com/maps/embed/v1/directions"
@@ -282,14 +686,221 @@ def normalize_endpoints(origin_text, dest_text, origin_pid="", dest_pid=""):
         # lat,lng manuellt?
         if re.match(r"^\s*-?\d+(\.\d+)?\s*,\s*-?\d+(\.\d+)?\s*$", s):
             return s, s
+        # Känd plats (titel/alias i Places) med koordinater → ingen geokodning
+        known = sheets_cache()["place_trie"].lookup(s) if s else None
+        if known and known["lat"] is not None and known["lng"] is not None:
+            return f"{known['lat']},{known['lng']}", known["title"]
         lat, lng, fmt = geocode_address(s) if s else (None, None, None)
         api = f"{lat},{lng}" if lat is not None and lng is not None else s
         return api, (fmt or s)
 
+    ensure_sheets_cache()
     o_api, o_disp = norm(origin_text, origin_pid)
     d_api, d_disp = norm(dest_text, dest_pid)
     return o_api, d_api, (o_disp or origin_text), (d_disp or dest_text)
 
+def route_travel_details(from_lat, from_lng, to_lat, to_lng, fresh=False):
+    """
+    Restid (min) och avstånd (km) mellan två koordinatpar, avrundat för lagring i Routes.
+    (None, None) om koordinater saknas eller Directions misslyckas.
+    fresh=True frågar alltid Google (periodisk uppdatering).
+    """
+    if not (from_lat and from_lng and to_lat and to_lng):
+        return None, None
+    try:
+        duration, distance = get_travel_details(
+            f"{from_lat},{from_lng}", f"{to_lat},{to_lng}", use_cache=not fresh
+        )
+    except Exception as e:
+        print("⚠️ route_travel_details fel:", e)
+        return None, None
+    if not duration or not distance:
+        return None, None
+    return round(duration, 1), round(distance, 2)
+
+BULK_WORKERS = int(os.getenv("BULK_GEOCODE_WORKERS", "8") or 8)
+
+# Requesttrådar per worker – samma env som gunicorn.conf.py läser
+WEB_THREADS = int(os.getenv("GUNICORN_THREADS", "1") or 1)
+# Hedge-poolen: varje samtidigt Maps-anrop (requesttrådar + bulkjobb) kan ha ett
+# försök och ett dubblettanrop igång
+deadline.configure(2 * (WEB_THREADS + BULK_WORKERS))
+
+def geocode_many(addresses):
+    """Geokoda unika adresser parallellt (max BULK_WORKERS åt gången) → {adress: (lat, lng, fmt)}."""
+    unique = list(dict.fromkeys(a for a in addresses if a))
+    if not unique:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(BULK_WORKERS, len(unique))) as pool:
+        return dict(zip(unique, pool.map(geocode_address, unique)))
+
+# -----------------------------------------------------------------------------
+# Fastprisrutter
+# -----------------------------------------------------------------------------
+# Hur nära (meter) en adress måste ligga en känd plats för att räknas som den
+SNAP_RADIUS_M = float(os.getenv("SNAP_RADIUS_M", "250") or 250)
+
+def find_fixed_route(from_title, to_title):
+    """Fastprisrutt (båda riktningar) för två platstitlar – O(1) via snapshotens index."""
+    refresh_sheets_cache()
+    return sheets_cache()["route_by_pair"].get(_route_key(from_title, to_title))
+
+def _place_latlng(title):
+    """'lat,lng' för en känd plats (titel/alias) med koordinater, annars None."""
+    place = sheets_cache()["place_trie"].lookup(title)
+    if place and _num(place["lat"]) is not None and _num(place["lng"]) is not None:
+        return f"{_num(place['lat'])},{_num(place['lng'])}"
+    return None
+
+def fixed_route_endpoints(route):
+    """
+    (o_api, d_api) för en fastprisrutt: sparade lat/lng, annars platsens lat/lng i Places,
+    sist sparad adress (geokodas – `flask backfill-coordinates` fyller i det som saknas).
+    """
+    if route.get("from_lat") and route.get("from_lng"):
+        o_api = f"{route['from_lat']},{route['from_lng']}"
+    else:
+        o_api = _place_latlng(route["from"])
+        if o_api is None:
+            o_api, _, _, _ = normalize_endpoints(route.get("from_address") or route["from"], "", "", "")
+
+    if route.get("to_lat") and route.get("to_lng"):
+        d_api = f"{route['to_lat']},{route['to_lng']}"
+    else:
+        d_api = _place_latlng(route["to"])
+        if d_api is None:
+            _, d_api, _, _ = normalize_endpoints("", route.get("to_address") or route["to"], "", "")
+    return o_api, d_api
+
+def snap_places(o_api, d_api):
+    """
+    Närmaste kända plats (inom SNAP_RADIUS_M) för båda ändpunkterna ('lat,lng').
+    Returnerar (o_place, d_place) eller (None, None) om någon saknas eller de är samma plats.
+    """
+    o, d = parse_latlng(o_api), parse_latlng(d_api)
+    if not o or not d:
+        return None, None
+    grid = sheets_cache()["place_grid"]
+    o_place, _ = grid.nearest(*o)
+    if not o_place:
+        return None, None
+    d_place, _ = grid.nearest(*d)
+    if not d_place or d_place is o_place:
+        return None, None
+    return o_place, d_place
+
+def snap_fixed_route(o_api, d_api):
+    """
+    Om båda ändpunkterna ('lat,lng') ligger inom SNAP_RADIUS_M från kända platser
+    och det finns en fastprisrutt mellan dem → returnera rutten, annars None.
+    """
+    o_place, d_place = snap_places(o_api, d_api)
+    if not o_place:
+        return None
+    return sheets_cache()["route_by_pair"].get(_route_key(o_place["title"], d_place["title"]))
+
+def fixed_price_rows(route, passenger_count):
+    """Prisrader för en fastprisrutt som gäller för antal passagerare (0 = visa alla)."""
+    rows = []
+    for price in route.get("prices", []):
+        min_p = int(price.get("min", 0))
+        max_raw = price.get("max")
+        max_p = int(max_raw) if max_raw not in (None, "") else 10**9
+        label = price.get("label", "Fastpris")
+
+        if passenger_count == 0 or (min_p <= passenger_count <= max_p):
+            if "total" in price:
+                cost = int(price["total"])
+            elif "price_per_person" in price:
+                base = passenger_count or min_p
+                cost = round(base * int(price["price_per_person"]))
+            else:
+                continue
+            rows.append({"tariff": label, "total_cost": cost})
+    return rows
+
+# -----------------------------------------------------------------------------
+# Offertmatris (förberäknat för alla par av kända platser)
+# -----------------------------------------------------------------------------
+QUOTE_MATRIX_PATH = os.getenv("QUOTE_MATRIX_PATH", "quote_matrix.bin")
+# Max antal Distance Matrix-anrop (10×10 par per anrop) per bygge – resten tas nästa gång
+QUOTE_MATRIX_BUDGET = int(os.getenv("QUOTE_MATRIX_BUDGET", "50") or 50)
+def quote_matrix_path():
+    """Aktuell tenants matrisfil (DEFAULT: QUOTE_MATRIX_PATH, annars <namn>-<tenant>.bin)."""
+    return tenants.per_tenant_path(QUOTE_MATRIX_PATH)
+
+def get_quote_matrix():
+    """Aktuell matris (mmap), laddas om när filen byggts om – även av en annan worker."""
+    path = quote_matrix_path()
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    loaded = tenant_state().quote_matrix
+    if mtime != loaded["mtime"]:
+        loaded["matrix"] = quote_matrix.load(path)
+        loaded["mtime"] = mtime
+    return loaded["matrix"]
+
+def quote_matrix_lookup(o_api, d_api):
+    """
+    Restid/avstånd/priser mellan två kända platser ur matrisen, annars None.
+    "prices" är None om tarifferna ändrats sedan bygget (räknas då om från restid/avstånd).
+    """
+    qm = get_quote_matrix()
+    if qm is None:
+        return None
+    o_place, d_place = snap_places(o_api, d_api)
+    if not o_place:
+        return None
+    cell = qm.lookup(o_place["id"], d_place["id"])
+    if cell and qm.tariff_version != tariff_version():
+        cell["prices"] = None
+    return cell
+
+def build_quote_matrix():
+    """Bygg om matrisen inkrementellt (återanvänder oförändrade par, hämtar resten inom budget)."""
+    refresh_sheets_cache(force=True)
+    places = []
+    for p in sheets_cache()["place_trie"].places:
+        try:
+            places.append((p["id"], float(p["lat"]), float(p["lng"])))
+        except (TypeError, ValueError):
+            continue
+    tariffs = calculate_derived_tariffs()
+    stats = quote_matrix.build(
+        quote_matrix_path(),
+        places,
+        list(tariffs),
+        tariff_version(),
+        price_fn=lambda dur, dist: [
+            calculate_price(dur, dist, t["start"], t["km"], t["hour"]) for t in tariffs.values()
+        ],
+        fetch_fn=get_travel_matrix,
+        budget=QUOTE_MATRIX_BUDGET,
+    )
+    if stats is None:
+        print(f"🧮 Offertmatris ({tenants.current()}): byggs redan av en annan process.")
+    else:
+        print(f"🧮 Offertmatris ({tenants.current()}):", stats)
+    return stats
+
+def schedule_quote_matrix_build():
+    """
+    Bygg om matrisen i bakgrunden efter ändrade platser/tariffer.
+    Görs bara om matrisen redan är påslagen (filen finns) – första bygget körs manuellt.
+    """
+    if not os.path.exists(quote_matrix_path()):
+        return
+
+    def run():
+        try:
+            single_flight(("build_quote_matrix", tenants.current()), build_quote_matrix)
+        except Exception as e:
+            print("⚠️ Offertmatris-bygge fel:", e)
+
+    threading.Thread(target=bind_tenant(run), name="quote-matrix", daemon=True).start()
+
 # -----------------------------------------------------------------------------
 # Pris/bilar
 # -----------------------------------------------------------------------------
@@ -306,205 +917,610 @@ def format_duration(minutes):
     m = int(minutes) % 60
     return f"{h}h {m}min" if h else f"{m}min"
 
-def distribute_cars(passengers: int):
+# Biltyper i den ordning de fördelas: (nyckel i get_fleet_limits(), platser)
+CAR_TYPES = (("large", 8), ("small", 4))
+
+def _fleet_limit(kind):
+    v = get_fleet_limits().get(kind)
+    return None if v in (None, "") else max(int(v), 0)
+
+def _fleet_rank(state):
+    """Sorteringsnyckel: pris, sedan antal bilar, sedan fler av de tidigare typerna."""
+    cost, cars, counts = state
+    return cost, cars, tuple(-n for n in counts)
+
+@lru_cache(maxsize=4096)
+def optimal_fleet(passengers, vehicles, tariff_ver=""):
     """
-    Fördela bilar med prioritet på storbil (8 platser).
-    Regler:
-    - 0 eller mindre -> 0 bilar
-    - Rester 1–4 -> +1 småbil (4 platser)
-    - Rester 5–7 -> +1 storbil (prioritera storbil)
-    Exempel: 5 -> 1 storbil, 16 -> 2 storbilar, 17 -> 2 stor + 1 liten, 3 -> 1 liten.
+    Billigaste bilkombination som rymmer alla (dynamisk programmering).
+    - vehicles: ((platser, pris per bil, max antal | None), ...)
+    - tariff_ver ingår bara i cachenyckeln – priserna i vehicles räknas ur tarifferna.
+    Tillstånd = antal täckta platser (tak vid passengers) → (totalpris, antal bilar, antal per typ).
+    Lika pris → färre bilar → fler av de första typerna (storbil före småbil).
+    Returnerar antal per typ (tuple) eller None om tillgängliga bilar inte räcker.
     """
     if passengers <= 0:
-        return 0, 0
+        return tuple(0 for _ in vehicles)
+    best = {0: (0, 0, ())}
+    for seats, price, limit in vehicles:
+        max_n = -(-passengers // seats)
+        if limit is not None:
+            max_n = min(max_n, limit)
+        nxt = {}
+        for covered, (cost, cars, counts) in best.items():
+            for n in range(max_n + 1):
+                cov = min(passengers, covered + n * seats)
+                cand = (cost + n * price, cars + n, counts + (n,))
+                cur = nxt.get(cov)
+                if cur is None or _fleet_rank(cand) < _fleet_rank(cur):
+                    nxt[cov] = cand
+                if cov == passengers:
+                    break
+        best = nxt
+    hit = best.get(passengers)
+    return hit[2] if hit else None
+
+def allocate_cars(passengers, large_price, small_price):
+    """
+    (storbilar, småbilar) med lägst totalpris för resan, inom get_fleet_limits().
+    None om bilarna inte räcker – då ska ingen offert ges (bilarna finns inte).
+    """
+    seats = dict(CAR_TYPES)
+    vehicles = (
+        (seats["large"], large_price, _fleet_limit("large")),
+        (seats["small"], small_price, _fleet_limit("small")),
+    )
+    return optimal_fleet(int(passengers), vehicles, tariff_version())
 
-    large = passengers // 8
-    rem = passengers % 8
+# -----------------------------------------------------------------------------
+# Offertjournal (append-only JSONL, roteras och gzippas)
+# -----------------------------------------------------------------------------
+QUOTE_JOURNAL_DIR = os.getenv("QUOTE_JOURNAL_DIR", "journal")  # tomt = av
+QUOTE_JOURNAL = QuoteJournal(
+    QUOTE_JOURNAL_DIR,
+    max_bytes=float(os.getenv("QUOTE_JOURNAL_MAX_MB", "10") or 10) * 1024 * 1024,
+    keep=int(os.getenv("QUOTE_JOURNAL_KEEP", "20") or 20),
+) if QUOTE_JOURNAL_DIR else None
+
+def journal_quote(entry):
+    """Lägg offerten i journalens buffert – ingen I/O i requesten."""
+    if QUOTE_JOURNAL is not None:
+        QUOTE_JOURNAL.record(entry)
+
+def replay_quote_journal():
+    """
+    Värm restidscacharna från journalen (t.ex. efter deploy) – inga API-anrop.
+    Ett pass över journalen; varje post hamnar i sin tenants cache.
+    Posterna behåller sin ursprungliga tid, så TTL gäller som vanligt.
+    """
+    if QUOTE_JOURNAL is None:
+        return 0
+    cutoff = time.time() - TRAVEL_CACHE_TTL_S
+    caches = {}  # tenant → TravelCache (None = tenant finns inte längre)
+    warmed = 0
+    for e in QUOTE_JOURNAL.iter_entries():
+        if e.get("ts", 0) < cutoff or e.get("travel_source") in (None, "fixed", "stale"):
+            continue
+        if not (e.get("o_api") and e.get("d_api") and e.get("duration_min") and e.get("distance_km")):
+            continue
+        tenant_id = e.get("tenant") or tenants.DEFAULT
+        if tenant_id not in caches:
+            caches[tenant_id] = TENANT_STATES.get(tenant_id).travel if tenants.exists(tenant_id) else None
+        if caches[tenant_id] is not None:
+            caches[tenant_id].put((e["o_api"], e["d_api"]), e["duration_min"], e["distance_km"], ts=e["ts"])
+            warmed += 1
+    return warmed
+
+def _stage(stages, name, t0):
+    """Spara tid sedan t0 (ms) under name och returnera ny starttid."""
+    now = time.perf_counter()
+    stages[name] = round((now - t0) * 1000.0, 2)
+    return now
 
-    if rem == 0:
-        return large, 0
-    if rem <= 4:
-        return large, 1
-    else:  # 5–7
-        return large + 1, 0
+# -----------------------------------------------------------------------------
+# Inställningar – renderade fragment per snapshot-version
+# -----------------------------------------------------------------------------
+ROUTES_PAGE_SIZE = int(os.getenv("SETTINGS_ROUTES_PAGE_SIZE", "50") or 50)
+def settings_fragment(name, page=None):
+    """
+    Renderad HTML för templates/_<name>.html, cachad tills snapshoten ändras.
+    Nyckeln är (name, page) – rutttabellen cachas per sida.
+    """
+    version = sheets_cache()["version"]
+    fragments = tenant_state().fragments
+    if fragments["version"] != version:
+        fragments.update(version=version, items={})
+    key = (name, page)
+    html = fragments["items"].get(key)
+    if html is None:
+        if name == "routes_rows":
+            routes = sheets_cache()["bidirectional"]
+            start = (page - 1) * ROUTES_PAGE_SIZE
+            ctx = {"routes": routes[start:start + ROUTES_PAGE_SIZE], "total": len(routes)}
+        else:
+            ctx = {"address_titles": get_address_titles_from_sheets()}
+        html = fragments["items"][key] = Markup(render_template(f"_{name}.html", **ctx))
+    return html
+
+def routes_page(first, last=None):
+    """Rader för sidorna first..last (inklusive) + räknare för "Visa fler"."""
+    last = last or first
+    total = len(sheets_cache()["bidirectional"])
+    n_pages = max(-(-total // ROUTES_PAGE_SIZE), 1)
+    last = min(last, n_pages)
+    rows = Markup("").join(settings_fragment("routes_rows", p) for p in range(first, last + 1))
+    return {
+        "rows": rows,
+        "total": total,
+        "shown": min(last * ROUTES_PAGE_SIZE, total),
+        "next_page": last + 1 if last < n_pages else None,
+    }
 
 # -----------------------------------------------------------------------------
 # Views
 # -----------------------------------------------------------------------------
+def resolve_quote_endpoints(origin, destination, is_fixed, origin_pid="", dest_pid=""):
+    """
+    (matched, o_api, d_api, o_disp, d_disp) för en offert.
+    Fastpris: vald rutt (eller None). Annars normaliserade ändpunkter + ev. "snappad" rutt.
+    """
+    if is_fixed:
+        matched = find_fixed_route(origin, destination)
+        if not matched:
+            return None, None, None, origin, destination
+        o_api, d_api = fixed_route_endpoints(matched)
+        return matched, o_api, d_api, matched["from"], matched["to"]
+    # Normalisera EN gång → samma input till både Directions och Embed
+    o_api, d_api, o_disp, d_disp = normalize_endpoints(origin, destination, origin_pid, dest_pid)
+    return snap_fixed_route(o_api, d_api), o_api, d_api, o_disp, d_disp
+
+# Total tidsbudget (s) för en offert: geokodning + Directions delar på den
+QUOTE_BUDGET_S = float(os.getenv("QUOTE_BUDGET_S", "10") or 10)
+
+def compute_quote(origin, destination, passenger_count, is_fixed=False, origin_pid="", dest_pid=""):
+    """
+    Beräkna en offert inom QUOTE_BUDGET_S. Returnerar (result | None, gmaps_url | None, journalpost).
+    journalpost["stages_ms"] fylls på av anroparen (render/total).
+    """
+    with deadline.budget(QUOTE_BUDGET_S):
+        return _compute_quote(origin, destination, passenger_count, is_fixed, origin_pid, dest_pid)
+
+def _compute_quote(origin, destination, passenger_count, is_fixed, origin_pid, dest_pid):
+    t = time.perf_counter()
+    stages = {}
+    tariffs = calculate_derived_tariffs()
+    result = gmaps_url = error = None
+    duration = distance = travel_source = stale_age = None
+    rows = []
+
+    # FASTPRIS – vald i dropdown, eller adresser som ligger vid kända platser med fast rutt
+    matched, o_api, d_api, o_disp, d_disp = resolve_quote_endpoints(
+        origin, destination, is_fixed, origin_pid, dest_pid
+    )
+    t = _stage(stages, "resolve", t)
+
+    fixed_rows = fixed_price_rows(matched, passenger_count) if matched else []
+    if matched and (fixed_rows or is_fixed):
+        # Restid/avstånd sparas på rutten när den skapas → inget Directions-anrop
+        duration, distance = matched.get("duration_min"), matched.get("distance_km")
+        travel_source = "fixed"
+        if not duration or not distance:
+            duration, distance, stale_age = get_travel_details_or_stale(o_api, d_api)
+            travel_source = "stale" if stale_age is not None else "directions"
+        t = _stage(stages, "travel", t)
+
+        rows = fixed_rows
+        if rows:
+            # Bygg både embed-karta och klicklänk från SAMMA parametrar
+            map_url, _, _ = generate_static_map_url(o_api, d_api)
+            gmaps_url = gmaps_directions_url_from_params(o_api, d_api)
+            result = {
+                "origin": o_disp,
+                "destination": d_disp,
+                "duration": format_duration(duration),
+                "distance": round(distance, 1) if distance else "–",
+                "calculations": rows,
+                "map_url": map_url,
+                "fixed_route": matched.get("title") or f"{matched['from']} → {matched['to']}",
+            }
+
+    # TARIFF (dynamisk) – även när en "snappad" rutt saknar prisrad för antalet
+    elif not is_fixed:
+        # Kända platser i båda ändar → förberäknat, annars Directions
+        cell = quote_matrix_lookup(o_api, d_api)
+        if cell:
+            duration, distance = cell["duration_min"], cell["distance_km"]
+            travel_source = "matrix"
+        else:
+            duration, distance, stale_age = get_travel_details_or_stale(o_api, d_api)
+            travel_source = "stale" if stale_age is not None else "directions"
+        t = _stage(stages, "travel", t)
+        matrix_prices = (cell or {}).get("prices") or {}
+
+        def unit_price(tname):
+            if tname in matrix_prices:
+                return matrix_prices[tname]
+            t = tariffs[tname]
+            return calculate_price(duration, distance, t["start"], t["km"], t["hour"])
+
+        if duration and distance:
+            rows = []
+            if passenger_count <= 0:
+                for name in tariffs:
+                    rows.append({"tariff": name, "total_cost": unit_price(name)})
+            else:
+                # Billigaste fördelning per prisnivå (ordinarie 1+2, rabatt 4+5)
+                ordinarie = allocate_cars(
+                    passenger_count, unit_price("Taxa 2 (Storbils)"), unit_price("Taxa 1 (Småbil)")
+                )
+                rabatt = allocate_cars(
+                    passenger_count, unit_price("Taxa 5 (Storbils Rabatt)"), unit_price("Taxa 4 (Småbil Rabatt)")
+                )
+                if ordinarie is None or rabatt is None:
+                    error = f"Inte tillräckligt med bilar för {passenger_count} passagerare."
+                    ordinarie = rabatt = (0, 0)
+                (n_large, n_small), (r_large, r_small) = ordinarie, rabatt
+
+                def per_tariff(tname, count):
+                    return unit_price(tname) * count
+
+                if n_small > 0:
+                    rows.append(
+                        {
+                            "tariff": f"Småbil – Taxa 1 ×{n_small}",
+                            "total_cost": per_tariff("Taxa 1 (Småbil)", n_small),
+                        }
+                    )
+                if r_small > 0:
+                    rows.append(
+                        {
+                            "tariff": f"Småbil – Taxa 4 ×{r_small}",
+                            "total_cost": per_tariff("Taxa 4 (Småbil Rabatt)", r_small),
+                        }
+                    )
+                if n_large > 0:
+                    rows.append(
+                        {
+                            "tariff": f"Storbils – Taxa 2 ×{n_large}",
+                            "total_cost": per_tariff("Taxa 2 (Storbils)", n_large),
+                        }
+                    )
+                if r_large > 0:
+                    rows.append(
+                        {
+                            "tariff": f"Storbils – Taxa 5 ×{r_large}",
+                            "total_cost": per_tariff("Taxa 5 (Storbils Rabatt)", r_large),
+                        }
+                    )
+
+            # Bygg både embed-karta och klicklänk från SAMMA parametrar
+            map_url, _, _ = generate_static_map_url(o_api, d_api)
+            gmaps_url = gmaps_directions_url_from_params(o_api, d_api)
+
+            result = {
+                "origin": o_disp,
+                "destination": d_disp,
+                "duration": format_duration(duration),
+                "distance": round(distance, 1),
+                "calculations": rows,
+                "map_url": map_url,
+                "error": error,
+            }
+
+    if result is not None and stale_age is not None:
+        # Markera att restiden inte är färsk (Google svarade inte inom budgeten)
+        result["stale"] = format_duration(stale_age / 60.0)
+    _stage(stages, "pricing", t)
+    journal = {
+        "ts": time.time(),
+        "tenant": tenants.current(),
+        "mode": "fixed" if is_fixed else "dynamic",
+        "origin": origin,
+        "destination": destination,
+        "o_api": o_api,
+        "d_api": d_api,
+        "passengers": passenger_count,
+        "route": (matched.get("title") or f"{matched['from']} → {matched['to']}") if matched else None,
+        "duration_min": duration,
+        "distance_km": distance,
+        "travel_source": travel_source,
+        "error": error,
+        "rows": rows if result else [],
+        "tariff_version": tariff_version(),
+        "snapshot_version": sheets_cache()["version"],
+        "stages_ms": stages,
+    }
+    return result, gmaps_url, journal
+
+def _parse_passengers(raw):
+    try:
+        n = int((raw or "").strip())
+    except (TypeError, ValueError):
+        return 0
+    return max(n, 0)
+
 @app.route("/", methods=["GET", "POST"])
 def index():
     result = None
     origin = ""
     destination = ""
     passenger_count = 0
-    tariffs = calculate_derived_tariffs()
     gmaps_url = None  # sätts per gren
+    journal = None  # post till offertjournalen (bara POST)
 
     if request.method == "POST":
+        t_start = time.perf_counter()
         origin = request.form.get("origin", "").strip()
         destination = request.form.get("destination", "").strip()
         origin_pid = (request.form.get("origin_place_id") or "").strip()
         dest_pid = (request.form.get("destination_place_id") or "").strip()
         is_fixed = request.form.get("fixed_price") == "1"
+        passenger_count = _parse_passengers(request.form.get("passengers", ""))
 
-        raw = (request.form.get("passengers", "") or "").strip()
-        try:
-            passenger_count = int(raw)
-        except (TypeError, ValueError):
-            passenger_count = 0
-        if passenger_count < 0:
-            passenger_count = 0
-
-        # FASTPRIS
-        if is_fixed:
-            routes = get_predefined_routes()
-            matched = next(
-                (r for r in routes if r.get("from") == origin and r.get("to") == destination),
-                None,
-            )
-            if matched:
-                # Om lat/lng finns – använd dem. Annars använd sparad adress.
-                if matched.get("from_lat") and matched.get("from_lng"):
-                    o_api = f"{matched['from_lat']},{matched['from_lng']}"
-                else:
-                    o_api, _, _, _ = normalize_endpoints(
-                        matched.get("from_address") or matched["from"], "", "", ""
-                    )
-
-                if matched.get("to_lat") and matched.get("to_lng"):
-                    d_api = f"{matched['to_lat']},{matched['to_lng']}"
-                else:
-                    d_api, _, _, _ = normalize_endpoints(
-                        "", matched.get("to_address") or matched["to"], "", ""
-                    )
-
-                duration, distance = get_travel_details(o_api, d_api)
-
-                # Bygg både embed-karta och klicklänk från SAMMA parametrar
-                map_url, _, _ = generate_static_map_url(o_api, d_api)
-                gmaps_url = gmaps_directions_url_from_params(o_api, d_api)
-
-                rows = []
-                for price in matched.get("prices", []):
-                    min_p = int(price.get("min", 0))
-                    max_raw = price.get("max")
-                    max_p = int(max_raw) if max_raw not in (None, "") else 10**9
-                    label = price.get("label", "Fastpris")
-
-                    if passenger_count == 0 or (min_p <= passenger_count <= max_p):
-                        if "total" in price:
-                            cost = int(price["total"])
-                        elif "price_per_person" in price:
-                            base = passenger_count or min_p
-                            cost = round(base * int(price["price_per_person"]))
-                        else:
-                            continue
-                        rows.append({"tariff": label, "total_cost": cost})
-
-                if rows:
-                    result = {
-                        "origin": matched["from"],
-                        "destination": matched["to"],
-                        "duration": format_duration(duration),
-                        "distance": round(distance, 1) if distance else "–",
-                        "calculations": rows,
-                        "map_url": map_url,
-                    }
-
-        # TARIFF (dynamisk)
-        else:
-            # Normalisera EN gång → samma input till både Directions och Embed
-            o_api, d_api, o_disp, d_disp = normalize_endpoints(
-                origin, destination, origin_pid, dest_pid
-            )
-            duration, distance = get_travel_details(o_api, d_api)
-
-            if duration and distance:
-                rows = []
-                if passenger_count <= 0:
-                    for name, t in tariffs.items():
-                        rows.append(
-                            {
-                                "tariff": name,
-                                "total_cost": calculate_price(
-                                    duration, distance, t["start"], t["km"], t["hour"]
-                                ),
-                            }
-                        )
-                else:
-                    n_large, n_small = distribute_cars(passenger_count)
-
-                    def per_tariff(tname, count):
-                        t = tariffs[tname]
-                        unit = calculate_price(duration, distance, t["start"], t["km"], t["hour"])
-                        return unit * count
-
-                    if n_small > 0:
-                        rows.append(
-                            {
-                                "tariff": f"Småbil – Taxa 1 ×{n_small}",
-                                "total_cost": per_tariff("Taxa 1 (Småbil)", n_small),
-                            }
-                        )
-                        rows.append(
-                            {
-                                "tariff": f"Småbil – Taxa 4 ×{n_small}",
-                                "total_cost": per_tariff("Taxa 4 (Småbil Rabatt)", n_small),
-                            }
-                        )
-                    if n_large > 0:
-                        rows.append(
-                            {
-                                "tariff": f"Storbils – Taxa 2 ×{n_large}",
-                                "total_cost": per_tariff("Taxa 2 (Storbils)", n_large),
-                            }
-                        )
-                        rows.append(
-                            {
-                                "tariff": f"Storbils – Taxa 5 ×{n_large}",
-                                "total_cost": per_tariff("Taxa 5 (Storbils Rabatt)", n_large),
-                            }
-                        )
-
-                # Bygg både embed-karta och klicklänk från SAMMA parametrar
-                map_url, _, _ = generate_static_map_url(o_api, d_api)
-                gmaps_url = gmaps_directions_url_from_params(o_api, d_api)
-
-                result = {
-                    "origin": o_disp,
-                    "destination": d_disp,
-                    "duration": format_duration(duration),
-                    "distance": round(distance, 1),
-                    "calculations": rows,
-                    "map_url": map_url,
-                }
+        result, gmaps_url, journal = compute_quote(
+            origin, destination, passenger_count, is_fixed, origin_pid, dest_pid
+        )
+        t = time.perf_counter()
 
     # GET eller POST utan resultat → rendera med gmaps_url (kan vara None)
-    return render_template(
+    html = render_template(
         "index.html",
         result=result,
         origin=origin,
         destination=destination,
         passengers=passenger_count,
         api_key=API_KEY,
-        predefined_routes=get_predefined_routes(),
+        predefined_routes=get_route_pairs(),
         gmaps_url=gmaps_url,
     )
+    if journal is not None:
+        stages = journal["stages_ms"]
+        _stage(stages, "render", t)
+        stages["total"] = round((time.perf_counter() - t_start) * 1000.0, 2)
+        journal_quote(journal)
+    return html
+
+# --------- Delbara offerter (GET /quote, cachebara) ----------
+# Kort: en proxy får inte fortsätta visa ett gammalt pris länge efter en tariffändring
+QUOTE_MAX_AGE = int(os.getenv("QUOTE_CACHE_MAX_AGE", "60") or 60)
+QUOTE_FORMATS = ("html", "json")
+
+def _canonical_endpoint(api, disp):
+    """Känd plats → dess titel, annars 'lat,lng' (avrundat) eller oförändrad text."""
+    known = sheets_cache()["place_trie"].lookup(disp) if disp else None
+    if known and known["lat"] is not None and api == f"{known['lat']},{known['lng']}":
+        return known["title"]
+    ll = parse_latlng(api)
+    if ll:
+        return f"{round(ll[0], 6)},{round(ll[1], 6)}"
+    return api
+
+def canonical_quote_args(origin, destination, passengers, is_fixed, fmt):
+    """
+    Query-parametrar för offertens kanoniska URL (samma offert → samma URL), None om okänd rutt.
+    tv/sv = tariff- och snapshot-version: sparade tariffer eller ändrade rutter ger en ny URL.
+    En tenant vald via ?tenant= ingår i URL:en (annars väljs den av host/X-Tenant).
+    """
+    if is_fixed:
+        matched = find_fixed_route(origin, destination)
+        if not matched:
+            return None
+        o, d = matched["from"], matched["to"]
+    else:
+        # place_id → koordinater, så URL:en inte beror på hur platsen valdes
+        ends = []
+        for text in (origin, destination):
+            if text.startswith("place_id:"):
+                lat, lng, _ = geocode_address(place_id=text[len("place_id:"):])
+                text = f"{lat},{lng}" if lat is not None else text
+            ends.append(text)
+        o_api, d_api, o_disp, d_disp = normalize_endpoints(*ends)
+        o, d = _canonical_endpoint(o_api, o_disp), _canonical_endpoint(d_api, d_disp)
+    args = {
+        "from": o,
+        "to": d,
+        "p": str(passengers),
+        "fixed": "1" if is_fixed else "0",
+        "format": fmt,
+        "tv": tariff_version(),
+        "sv": sheets_cache()["version"] or "",
+    }
+    if g.get("tenant_query"):
+        args["tenant"] = g.tenant_query
+    return args
+
+@app.route("/quote")
+def quote_view():
+    """
+    Offert via GET. Icke-kanoniska URL:er (eller gamla versioner) → 302 till kanonisk URL;
+    den kanoniska svarar med stark ETag + Cache-Control så webbläsare/proxy kan återanvända den.
+    """
+    refresh_sheets_cache()
+    origin = (request.args.get("from") or "").strip()
+    destination = (request.args.get("to") or "").strip()
+    if not origin or not destination:
+        return jsonify({"error": "Både 'from' och 'to' krävs."}), 400
+    is_fixed = request.args.get("fixed") == "1"
+    passenger_count = _parse_passengers(request.args.get("p", ""))
+    fmt = request.args.get("format", "html")
+    if fmt not in QUOTE_FORMATS:
+        fmt = "html"
+
+    # Kanonisering (place_id/geokodning) och offerten delar på samma QUOTE_BUDGET_S
+    t_start = time.perf_counter()
+    with deadline.budget(QUOTE_BUDGET_S):
+        canonical = canonical_quote_args(origin, destination, passenger_count, is_fixed, fmt)
+        if canonical is None:
+            return jsonify({"error": "Ingen fastprisrutt mellan platserna."}), 404
+        if request.args.to_dict() != canonical:
+            return redirect(url_for("quote_view", **canonical), code=302)
+        result, gmaps_url, journal = compute_quote(origin, destination, passenger_count, is_fixed)
+    t = time.perf_counter()
+    if fmt == "json":
+        resp = jsonify({
+            "from": origin,
+            "to": destination,
+            "passengers": passenger_count,
+            "fixed": is_fixed,
+            "tariff_version": canonical["tv"],
+            "snapshot_version": canonical["sv"],
+            "quote": result,
+            "gmaps_url": gmaps_url,
+        })
+    else:
+        resp = Response(render_template(
+            "index.html",
+            result=result,
+            origin=result["origin"] if result else origin,
+            destination=result["destination"] if result else destination,
+            passengers=passenger_count,
+            api_key=API_KEY,
+            predefined_routes=get_route_pairs(),
+            gmaps_url=gmaps_url,
+        ))
+    stages = journal["stages_ms"]
+    _stage(stages, "render", t)
+    stages["total"] = round((time.perf_counter() - t_start) * 1000.0, 2)
+    journal["mode"] += "-get"
+    journal_quote(journal)
+
+    if result is None:
+        resp.status_code = 404
+        return resp
+    resp.set_etag(hashlib.sha1(resp.get_data()).hexdigest())
+    if g.get("tenant_override"):
+        resp.cache_control.private = True  # admin som valt tenant – inget för delade cachar
+    else:
+        resp.cache_control.public = True
+    resp.cache_control.max_age = QUOTE_MAX_AGE
+    resp.cache_control.must_revalidate = True
+    resp.vary.add("X-Tenant")
+    return resp.make_conditional(request)
+
+# Autocomplete-sessionstoken från webbläsaren (UUID)
+SESSION_TOKEN_RE = re.compile(r"[A-Za-z0-9-]{8,64}")
+
+@app.route("/api/places/suggest")
+def places_suggest():
+    """
+    Typeahead för Från/Till: kända platser (titel/alias) först, med koordinater.
+    Google Places Autocomplete anropas bara om inget lokalt matchar.
+    """
+    q = (request.args.get("q") or "").strip()
+    try:
+        limit = max(1, min(int(request.args.get("limit", 8)), 20))
+    except ValueError:
+        limit = 8
+
+    ensure_sheets_cache()
+    local = sheets_cache()["place_trie"].search(q, limit)
+    if local:
+        return jsonify({"source": "local", "suggestions": local})
+    if len(q) < 3:
+        return jsonify({"source": "local", "suggestions": []})
+    session = request.args.get("session", "")
+    if not SESSION_TOKEN_RE.fullmatch(session):
+        session = ""
+    return jsonify({"source": "google", "suggestions": places_autocomplete(q, session)[:limit]})
+
+# -----------------------------------------------------------------------------
+# Bulkimport/-export
+# -----------------------------------------------------------------------------
+def import_bulk(kind, stream, fmt):
+    """Importera platser eller rutter från en CSV/JSONL-ström. Returnerar bulk_io.ImportReport."""
+    report = bulk_io.ImportReport()
+    refresh_sheets_cache(force=True)
+    records = bulk_io.iter_records(stream, fmt)
+
+    if kind == "places":
+        existing = {_norm(p.get("Title", "")) for p in sheets_cache()["places"]}
+        places = bulk_io.read_places(records, existing, report)
+        geo = geocode_many(p["address"] for p in places if p["lat"] is None or p["lng"] is None)
+        for p in places:
+            if (p["lat"] is None or p["lng"] is None) and p["address"] in geo:
+                lat, lng, fmt_addr = geo[p["address"]]
+                if lat is not None and lng is not None:
+                    p["lat"], p["lng"], p["address"] = lat, lng, fmt_addr or p["address"]
+                    report.geocoded += 1
+        report.added = len(append_places_bulk(places))
+
+    elif kind == "routes":
+        existing = {r.get("key") for r in sheets_cache()["routes"]}
+        routes = bulk_io.read_routes(records, existing, report)
+        trie = sheets_cache()["place_trie"]
+
+        # Adress + koordinater från Places i första hand, geokoda resten
+        for r in routes:
+            for end in ("from", "to"):
+                place = trie.lookup(r[f"{end}_title"])
+                if not place:
+                    continue
+                r[f"{end}_address"] = r[f"{end}_address"] or place["address"]
+                if r[f"{end}_lat"] is None and place["lat"] is not None:
+                    r[f"{end}_lat"], r[f"{end}_lng"] = place["lat"], place["lng"]
+
+        missing = [
+            r[f"{end}_address"] for r in routes for end in ("from", "to")
+            if r[f"{end}_lat"] is None or r[f"{end}_lng"] is None
+        ]
+        geo = geocode_many(missing)
+        for r in routes:
+            for end in ("from", "to"):
+                addr = r[f"{end}_address"]
+                if (r[f"{end}_lat"] is None or r[f"{end}_lng"] is None) and addr in geo:
+                    lat, lng, _ = geo[addr]
+                    if lat is not None and lng is not None:
+                        r[f"{end}_lat"], r[f"{end}_lng"] = lat, lng
+                        report.geocoded += 1
+
+        # Restid/avstånd sparas direkt, precis som när en rutt skapas i formuläret
+        if routes:
+            with ThreadPoolExecutor(max_workers=min(BULK_WORKERS, len(routes))) as pool:
+                travel = pool.map(
+                    bind_tenant(lambda r: route_travel_details(r["from_lat"], r["from_lng"], r["to_lat"], r["to_lng"])),
+                    routes,
+                )
+                for r, (dur, dist) in zip(routes, travel):
+                    r["duration_min"], r["distance_km"] = dur, dist
+
+        res = append_routes_bulk(routes)
+        report.added = len(res["added"])
+        report.duplicates.extend(res["duplicates"])
+    else:
+        raise ValueError(f"Okänd importtyp: {kind}")
+
+    refresh_sheets_cache(force=True)
+    return report
+
+@app.route("/settings/export/<kind>.<fmt>")
+def settings_export(kind, fmt):
+    """Strömma nuvarande snapshot som CSV/JSONL (places eller routes)."""
+    if fmt not in bulk_io.FORMATS or kind not in ("places", "routes"):
+        return "Okänd export.", 404
+    refresh_sheets_cache()
+    if kind == "places":
+        rows = bulk_io.export_places(list(sheets_cache()["places"]), fmt)
+    else:
+        rows = bulk_io.export_routes(list(sheets_cache()["routes"]), fmt)
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    return Response(
+        rows,
+        mimetype=f"{mimetype}; charset=utf-8",
+        headers={"Content-Disposition": f"attachment; filename={kind}.{fmt}"},
+    )
 
 # -----------------------------------------------------------------------------
 # Settings
 # -----------------------------------------------------------------------------
 @app.route("/settings", methods=["GET", "POST"])
 def settings():
-    global user_tariffs
-
     if request.method == "POST":
         action = request.form.get("action", "")
 
         # --- Tariffer ---
         if action == "save_tariffs":
             updated = {}
-            for key, vals in user_tariffs.items():
+            for key, vals in get_user_tariffs().items():
                 start = request.form.get(f"{key}_start", vals.get("start", 0))
                 km = request.form.get(f"{key}_km", vals.get("km", 0))
                 hour = request.form.get(f"{key}_hour", vals.get("hour", 0))
@@ -512,14 +1528,15 @@ def settings():
                     updated[key] = {"start": float(start), "km": float(km), "hour": float(hour)}
                 except Exception:
                     updated[key] = vals
-            user_tariffs = updated
-
             data = load_settings()
-            data["tariffs"] = user_tariffs
+            data["tariffs"] = updated
             save_settings(data)
+            tenant_state().settings = data
+            tenant_state().settings_mtime = _settings_mtime()
 
             flash("Tariffer sparade.", "success")
             refresh_sheets_cache(force=True)
+            schedule_quote_matrix_build()
             return redirect(url_for("settings"))
 
         # --- Lägg till plats ---
@@ -546,6 +1563,7 @@ def settings():
                 flash(f"Kunde inte lägga till plats: {e}", "danger")
 
             refresh_sheets_cache(force=True)
+            schedule_quote_matrix_build()
             return redirect(url_for("settings"))
 
         # --- Lägg till rutt ---
@@ -616,37 +1634,27 @@ def settings():
                 if not label:
                     continue
 
-                min_v = mins[i].strip() if i < len(mins) else ""
-                max_v = maxs[i].strip() if i < len(maxs) else ""
-                total = totals[i].strip() if i < len(totals) else ""
-                ppp = ppps[i].strip() if i < len(ppps) else ""
-
-                if not min_v:
-                    flash(f"Pris '{label}' måste ha Min.", "warning")
-                    refresh_sheets_cache(force=True)
-                    return redirect(url_for("settings"))
-
-                if (total == "" and ppp == "") or (total != "" and ppp != ""):
-                    flash(
-                        f"Pris '{label}' måste ha antingen Total eller Pris/Person.",
-                        "warning",
+                try:
+                    prices.append(
+                        parse_price_band(
+                            label,
+                            mins[i] if i < len(mins) else "",
+                            maxs[i] if i < len(maxs) else "",
+                            totals[i] if i < len(totals) else "",
+                            ppps[i] if i < len(ppps) else "",
+                        )
                     )
+                except ValueError as e:
+                    flash(str(e), "warning")
                     refresh_sheets_cache(force=True)
                     return redirect(url_for("settings"))
 
-                price = {"label": label, "min": int(min_v)}
-                if max_v != "":
-                    price["max"] = int(max_v)
-                if total != "":
-                    price["total"] = int(total)
-                if ppp != "":
-                    price["price_per_person"] = int(ppp)
-                prices.append(price)
-
             create_reverse = request.form.get("route_create_reverse") == "on"
             title = (request.form.get("route_title") or f"{from_title} → {to_title}").strip()
 
             try:
+                # Directions körs EN gång här; restid/avstånd sparas på rutten
+                dur, dist = route_travel_details(flt, fln, tlt, tln)
                 res = append_route_with_prices(
                     from_title,
                     to_title,
@@ -658,6 +1666,8 @@ def settings():
                     to_lat=tlt,
                     to_lng=tln,
                     prices=prices,
+                    duration_min=dur,
+                    distance_km=dist,
                 )
 
                 # Säkra att lat/lng/adresser verkligen finns i raden
@@ -684,6 +1694,7 @@ def settings():
                     print("⚠️ update_place_latlng_by_title misslyckades:", e)
 
                 if create_reverse:
+                    rdur, rdist = route_travel_details(tlt, tln, flt, fln)
                     append_route_with_prices(
                         to_title,
                         from_title,
@@ -696,6 +1707,8 @@ def settings():
                         to_lng=fln,
                         prices=prices,
                         group_id=res["group_id"],
+                        duration_min=rdur,
+                        distance_km=rdist,
                     )
                     # Uppdatera returvägen också
                     try:
@@ -703,7 +1716,7 @@ def settings():
                         rev = next(
                             (
                                 r
-                                for r in SHEETS_CACHE["routes"]
+                                for r in sheets_cache()["routes"]
                                 if r.get("from") == to_title and r.get("to") == from_title
                             ),
                             None,
@@ -728,6 +1741,31 @@ def settings():
             refresh_sheets_cache(force=True)
             return redirect(url_for("settings"))
 
+        # --- Bulkimport (CSV/JSONL) ---
+        if action == "import_bulk":
+            kind = request.form.get("import_kind", "routes")
+            upload = request.files.get("import_file")
+            if not upload or not upload.filename:
+                flash("Välj en fil att importera.", "warning")
+                return redirect(url_for("settings"))
+            try:
+                report = import_bulk(kind, upload.stream, bulk_io.detect_format(upload.filename))
+                flash(f"Import klar: {report.summary()}.", "warning" if report.errors else "success")
+            except Exception as e:
+                flash(f"Kunde inte importera: {e}", "danger")
+            refresh_sheets_cache(force=True)
+            if kind == "places":
+                schedule_quote_matrix_build()
+            return redirect(url_for("settings"))
+
+        # --- Fyll i saknade koordinater ---
+        if action == "backfill_coordinates":
+            if start_coordinate_backfill():
+                flash("Koordinaterna fylls i i bakgrunden – ladda om sidan om en stund för resultatet.", "success")
+            else:
+                flash("Koordinaterna fylls redan i – vänta tills körningen är klar.", "warning")
+            return redirect(url_for("settings"))
+
         # --- Ta bort rutt ---
         if action == "delete_route":
             rid = (request.form.get("route_id") or "").strip()
@@ -748,25 +1786,387 @@ def settings():
             except Exception as e:
                 flash(f"Kunde inte radera plats: {e}", "danger")
             refresh_sheets_cache(force=True)
+            schedule_quote_matrix_build()
             return redirect(url_for("settings"))
 
         flash("Okänd åtgärd.", "warning")
         refresh_sheets_cache(force=True)
         return redirect(url_for("settings"))
 
-    # GET
-    address_titles = get_address_titles_from_sheets()
-    predefined = get_predefined_routes()
+    # GET – tabellerna kommer från fragmentcachen, rutterna sidvis
+    refresh_sheets_cache()
+    pages = max(request.args.get("routes_page", 1, type=int) or 1, 1)
     return render_template(
         "settings.html",
-        tariffs=user_tariffs,
-        address_titles=address_titles,
-        predefined=predefined,
+        tariffs=get_user_tariffs(),
+        address_count=len(sheets_cache()["places"]),
+        place_options=settings_fragment("place_options"),
+        places_rows=settings_fragment("places_rows"),
+        routes_page=routes_page(1, pages),
+        backfill=tenant_state().backfill,
         api_key=API_KEY,
     )
 
+@app.route("/settings/routes")
+def settings_routes_page():
+    """En sida rutter som HTML-rader (för "Visa fler")."""
+    refresh_sheets_cache()
+    page = max(request.args.get("page", 1, type=int) or 1, 1)
+    return jsonify(routes_page(page))
+
+# -----------------------------------------------------------------------------
+# Diagnostik (latens + kvot, endast läsning)
+# -----------------------------------------------------------------------------
+DIAGNOSTICS_MAX_SAMPLES = 20
+# Webben: få anrop per probe och inga hela-blad-läsningar (gunicorns timeout + Sheets kvot)
+WEB_DIAGNOSTICS_MAX_SAMPLES = 3
+DIAG_ADDRESS = os.getenv("DIAG_ADDRESS", "Östersund")
+
+def _diagnostic_points():
+    """Två kända platser med koordinater ur snapshoten, annars DIAG_ORIGIN/DIAG_DESTINATION."""
+    ensure_sheets_cache()
+    pts = [f"{p['lat']},{p['lng']}" for p in sheets_cache()["place_trie"].places
+           if p["lat"] is not None and p["lng"] is not None][:2]
+    if len(pts) < 2:
+        pts = [os.getenv("DIAG_ORIGIN", "63.3985,13.0815"), os.getenv("DIAG_DESTINATION", "63.1944,14.5004")]
+    return pts[0], pts[1]
+
+def run_diagnostics(samples=5, sheets=True, maps=True, full=True):
+    """full=False: billig variant för webben (se sheets_repo.diagnostic_probes)."""
+    samples = max(1, min(int(samples), DIAGNOSTICS_MAX_SAMPLES if full else WEB_DIAGNOSTICS_MAX_SAMPLES))
+    probes = []
+    if sheets:
+        try:
+            probes += sheets_diagnostic_probes(full=full)
+        except Exception as e:
+            print("⚠️ Diagnostik: Sheets kunde inte öppnas:", e)
+            status = diagnostics.status_of(e)
+            probes.append(("sheets.open", lambda: status))
+    if maps:
+        origin, destination = _diagnostic_points()
+        probes += diagnostics.maps_probes(API_KEY, origin, destination, DIAG_ADDRESS)
+    report = diagnostics.run(probes, samples)
+    report["startup_ms"] = dict(STARTUP)
+    report["tenant"] = tenants.current()
+    report["tenants_bytes"] = TENANT_STATES.usage()
+    return report
+
+@app.route("/diagnostics")
+def diagnostics_view():
+    """Kort mätning (1–3 anrop per probe) – kräver ADMIN_TOKEN. Full körning: `flask diagnostics`."""
+    if not admin_authorized():
+        return jsonify({"error": "Kräver admin-token."}), 403
+    report = run_diagnostics(
+        request.args.get("samples", 1, type=int),
+        sheets=request.args.get("sheets", "1") != "0",
+        maps=request.args.get("maps", "1") != "0",
+        full=False,
+    )
+    return jsonify(report), 200 if report["status"] == "ok" else 503
+
+@app.cli.command("diagnostics")
+@click.option("--samples", default=5, show_default=True, help="Anrop per probe.")
+@click.option("--no-sheets", is_flag=True, help="Hoppa över Sheets.")
+@click.option("--no-maps", is_flag=True, help="Hoppa över Google Maps.")
+def diagnostics_command(samples, no_sheets, no_maps):
+    """Mät latens (p50/p95/p99) och kvotfel mot Sheets och Google Maps."""
+    report = run_diagnostics(samples, sheets=not no_sheets, maps=not no_maps)
+    print(diagnostics.format_report(report))
+
+# -----------------------------------------------------------------------------
+# Bakgrundsjobb
+# -----------------------------------------------------------------------------
+def refresh_route_travel_details():
+    """Hämta om restid/avstånd för alla rutter med koordinater och skriv tillbaka i bulk."""
+    refresh_sheets_cache(force=True)
+    travel = {}
+    for r in sheets_cache()["routes"]:
+        dur, dist = route_travel_details(
+            r.get("from_lat"), r.get("from_lng"), r.get("to_lat"), r.get("to_lng"), fresh=True
+        )
+        if dur and dist and r.get("route_id"):
+            travel[r["route_id"]] = (dur, dist)
+    n = update_routes_travel_details(travel)
+    refresh_sheets_cache(force=True)
+    return n
+
+def coordinate_coverage():
+    """Hur många platser/ruttändar i snapshoten som har koordinater → {blad: (med, totalt)}."""
+    places = [p for p in sheets_cache()["places"] if p.get("Title")]
+    routes = sheets_cache()["routes"]
+    return {
+        "places": (sum(1 for p in places if _num(p.get("Lat")) is not None and _num(p.get("Lng")) is not None),
+                   len(places)),
+        "route_ends": (sum(1 for r in routes for end in ("from", "to")
+                           if r.get(f"{end}_lat") is not None and r.get(f"{end}_lng") is not None),
+                       2 * len(routes)),
+    }
+
+def format_coverage(coverage):
+    parts = []
+    for name, label in (("places", "platser"), ("route_ends", "ruttändar")):
+        have, total = coverage[name]
+        parts.append(f"{label} {have}/{total} ({100.0 * have / total if total else 100.0:.0f} %)")
+    return ", ".join(parts)
+
+def backfill_coordinates():
+    """
+    Fyll i saknade koordinater i Places och Routes, så att fastprisvägen aldrig geokodar.
+    - Ruttändar tar koordinater från platsen med samma titel i första hand – även när
+      platsen själv geokodas i samma körning (dess adress slås bara upp en gång).
+    - Resten geokodas parallellt, varje unik adress en gång (geocode_many).
+    - Skrivs tillbaka med ett batch_update per blad.
+    Returnerar {"before", "after", "geocoded", "from_places", "written", "unresolved"}.
+    """
+    refresh_sheets_cache(force=True)
+    before = coordinate_coverage()
+    trie = sheets_cache()["place_trie"]
+
+    # Platser utan koordinater: titel → adress att geokoda
+    place_addr = {}
+    for p in sheets_cache()["places"]:
+        title = p.get("Title", "")
+        if title and (_num(p.get("Lat")) is None or _num(p.get("Lng")) is None):
+            place_addr.setdefault(title, p.get("Address") or title)
+
+    # Ruttändar utan koordinater: (route_id, ände, känd plats eller None, adress)
+    ends = []
+    for r in sheets_cache()["routes"]:
+        if not r.get("route_id"):
+            continue
+        for end in ("from", "to"):
+            if r.get(f"{end}_lat") is None or r.get(f"{end}_lng") is None:
+                place = trie.lookup(r[end])
+                addr = r.get(f"{end}_address") or (place["address"] if place else "") or r[end]
+                ends.append((r["route_id"], end, place, addr))
+
+    def stored_coords(place):
+        if place is not None and _num(place["lat"]) is not None and _num(place["lng"]) is not None:
+            return _num(place["lat"]), _num(place["lng"])
+        return None
+
+    def geo_coords(addr):
+        lat, lng, _ = geo.get(addr) or (None, None, None)
+        return (lat, lng) if lat is not None and lng is not None else None
+
+    def queued_place(place):
+        return place is not None and place["title"] in place_addr
+
+    # Ruttändar vars plats ändå geokodas i samma körning återanvänder platsens svar
+    geo = geocode_many(list(place_addr.values()) + [
+        addr for _, _, place, addr in ends
+        if stored_coords(place) is None and not queued_place(place)
+    ])
+
+    places_out = {}
+    for title, addr in place_addr.items():
+        coords = geo_coords(addr)
+        if coords:
+            places_out[title] = coords
+    routes_out, from_places, unresolved = {}, 0, []
+    for rid, end, place, addr in ends:
+        coords = stored_coords(place)
+        if coords:
+            from_places += 1  # bara platser som redan hade koordinater i Places
+        else:
+            coords = geo_coords(place_addr[place["title"]] if queued_place(place) else addr)
+        if coords:
+            routes_out.setdefault(rid, {})[end] = coords
+        else:
+            unresolved.append(f"{rid} ({end}: {addr})")
+    unresolved += [title for title in place_addr if title not in places_out]
+
+    written = fill_missing_coordinates(places_out, routes_out)
+    refresh_sheets_cache(force=True)
+    return {
+        "before": before,
+        "after": coordinate_coverage(),
+        "geocoded": sum(1 for v in geo.values() if v[0] is not None),
+        "from_places": from_places,
+        "written": written,
+        "unresolved": unresolved,
+    }
+
+def format_backfill(res):
+    """Kort sammanfattning av backfill_coordinates() för flash/inställningssidan."""
+    text = (f"{format_coverage(res['after'])} ({res['geocoded']} adresser geokodade, "
+            f"{res['from_places']} ruttändar från Places")
+    if res["unresolved"]:
+        text += f", {len(res['unresolved'])} gick inte att hitta"
+    return text + ")"
+
+_BACKFILL_LOCK = threading.Lock()
+
+def start_coordinate_backfill():
+    """
+    Kör backfill_coordinates() i en bakgrundstråd – en gammal flik kan ha hundratals
+    adresser att geokoda, mer än en request hinner. En körning i taget per tenant;
+    False om en redan pågår. Status/resultat i tenant_state().backfill.
+    """
+    status = tenant_state().backfill
+    with _BACKFILL_LOCK:
+        if status["running"]:
+            return False
+        status.update(running=True, error=None)
+
+    def run():
+        try:
+            res = backfill_coordinates()
+            status["summary"] = format_backfill(res)
+            for item in res["unresolved"]:
+                print(f"⚠️ Saknar fortfarande koordinater: {item}")
+            schedule_quote_matrix_build()
+        except Exception as e:
+            print("⚠️ Koordinat-backfill fel:", e)
+            status["error"] = str(e)
+        finally:
+            status.update(running=False, finished_at=time.time())
+
+    threading.Thread(target=bind_tenant(run), name="coordinate-backfill", daemon=True).start()
+    return True
+
+def start_periodic_job(name, interval_s, fn):
+    """Kör fn() var interval_s sekund i en daemon-tråd (0/negativt = avstängt)."""
+    if not interval_s or interval_s <= 0:
+        return None
+
+    def loop():
+        while True:
+            time.sleep(interval_s)
+            try:
+                fn()
+            except Exception as e:
+                print(f"⚠️ Bakgrundsjobb {name} fel:", e)
+
+    t = threading.Thread(target=loop, name=name, daemon=True)
+    t.start()
+    return t
+
+@app.cli.command("refresh-route-travel")
+def refresh_route_travel_command():
+    """Uppdatera restid/avstånd på alla fastprisrutter, för alla tenants (för cron)."""
+    for tenant_id, n in for_each_tenant(refresh_route_travel_details).items():
+        print(f"[{tenant_id}] Uppdaterade restid/avstånd på {n} rutter.")
+
+@app.cli.command("backfill-coordinates")
+def backfill_coordinates_command():
+    """Fyll i saknade koordinater i Places och Routes, för alla tenants."""
+    for tenant_id, res in for_each_tenant(backfill_coordinates).items():
+        print(f"[{tenant_id}] Före: {format_coverage(res['before'])}")
+        print(f"[{tenant_id}] Efter: {format_backfill(res)}")
+        for item in res["unresolved"]:
+            print(f"[{tenant_id}] ⚠️ Saknar fortfarande koordinater: {item}")
+
+@app.cli.command("build-quote-matrix")
+def build_quote_matrix_command():
+    """Bygg/uppdatera offertmatrisen för alla par av kända platser, för alla tenants."""
+    for tenant_id, stats in for_each_tenant(build_quote_matrix).items():
+        if stats is None:
+            continue
+        print(f"[{tenant_id}] Offertmatris: {stats['filled']}/{stats['pairs']} par klara ({stats['requests']} API-anrop).")
+
+@app.cli.command("tenant-memory")
+def tenant_memory_command():
+    """Mät (tracemalloc) vad varje tenants snapshot tar i minnet, mot uppskattningen."""
+    import gc
+    import tracemalloc
+    tracemalloc.start()
+    for tenant_id in tenants.all_tenants():
+        TENANT_STATES.discard(tenant_id)
+        gc.collect()
+        before = tracemalloc.get_traced_memory()[0]
+        with tenants.use(tenant_id):
+            refresh_sheets_cache(force=True)
+            gc.collect()
+            measured = tracemalloc.get_traced_memory()[0] - before
+            estimated = tenant_state().size_bytes()
+            n_places, n_routes = len(sheets_cache()["places"]), len(sheets_cache()["routes"])
+        print(f"[{tenant_id}] {n_places} platser, {n_routes} rutter: "
+              f"uppmätt {measured / 1024:.0f} KiB, uppskattat {estimated / 1024:.0f} KiB")
+    tracemalloc.stop()
+
+@app.cli.command("replay-quote-journal")
+def replay_quote_journal_command():
+    """Värm restidscachen från offertjournalen."""
+    print(f"Värmde {replay_quote_journal()} par från offertjournalen.")
+
+# Värm restidscachen från journalen vid uppstart (0 = av)
+QUOTE_JOURNAL_REPLAY = os.getenv("QUOTE_JOURNAL_REPLAY", "1") == "1"
+
+# Timmar mellan automatiska uppdateringar av restid/avstånd (0 = av, kör via cron i stället)
+ROUTE_TRAVEL_REFRESH_HOURS = float(os.getenv("ROUTE_TRAVEL_REFRESH_HOURS", "0") or 0)
+
+# Minuter mellan inkrementella matrisbyggen (0 = av)
+QUOTE_MATRIX_REFRESH_MIN = float(os.getenv("QUOTE_MATRIX_REFRESH_MIN", "0") or 0)
+
+# Sekunder mellan svep som släpper inaktiva tenants ur minnet
+TENANT_SWEEP_S = float(os.getenv("TENANT_SWEEP_S", "60") or 60)
+
+# Trådar överlever inte fork → startas per process vid första requesten, inte vid import
+_BACKGROUND = {"pid": None, "journal_replayed": False}
+_BACKGROUND_LOCK = threading.Lock()
+
+def start_background_jobs():
+    with _BACKGROUND_LOCK:
+        if _BACKGROUND["pid"] == os.getpid():
+            return
+        _BACKGROUND["pid"] = os.getpid()
+        replay = QUOTE_JOURNAL_REPLAY and QUOTE_JOURNAL is not None and not _BACKGROUND["journal_replayed"]
+        _BACKGROUND["journal_replayed"] = True
+    if replay:
+        threading.Thread(target=replay_quote_journal, name="journal-replay", daemon=True).start()
+    start_periodic_job(
+        "route-travel-refresh", ROUTE_TRAVEL_REFRESH_HOURS * 3600,
+        lambda: for_each_tenant(refresh_route_travel_details),
+    )
+    start_periodic_job("quote-matrix", QUOTE_MATRIX_REFRESH_MIN * 60, lambda: for_each_tenant(build_quote_matrix))
+    start_periodic_job("tenant-sweep", TENANT_SWEEP_S, TENANT_STATES.sweep)
+
+@app.before_request
+def _ensure_background_jobs():
+    if _BACKGROUND["pid"] != os.getpid():
+        start_background_jobs()
+
+# -----------------------------------------------------------------------------
+# Uppstart (förvärmning + rapport)
+# -----------------------------------------------------------------------------
+STARTUP = {}  # ms per steg – loggas vid uppstart och visas i /diagnostics
+
+def prewarm():
+    """
+    Gör uppstartens dyra steg i förväg – i gunicorn-mastern före fork (gunicorn.conf.py),
+    så att workers ärver Sheets-stacken, snapshoten och restidscachen i stället för
+    att betala för dem vid första requesten.
+    """
+    t = time.perf_counter()
+    get_settings()
+    t = _stage(STARTUP, "settings", t)
+    try:
+        sheets_prewarm()
+    except Exception as e:
+        print("⚠️ Förvärmning: Sheets kunde inte öppnas:", e)
+    t = _stage(STARTUP, "sheets_auth", t)
+    refresh_sheets_cache(force=True)
+    t = _stage(STARTUP, "snapshot", t)
+    get_quote_matrix()
+    t = _stage(STARTUP, "quote_matrix", t)
+    if QUOTE_JOURNAL_REPLAY and QUOTE_JOURNAL is not None:
+        STARTUP["journal_pairs"] = replay_quote_journal()
+        _BACKGROUND["journal_replayed"] = True
+        _stage(STARTUP, "journal", t)
+    print(startup_report())
+
+def startup_report() -> str:
+    steps = ", ".join(
+        f"{k} {v:.0f} ms" for k, v in STARTUP.items() if k != "journal_pairs"
+    )
+    return f"🚀 Uppstart: {steps}"
+
 # -----------------------------------------------------------------------------
 # Entrypoint
 # -----------------------------------------------------------------------------
+STARTUP["import"] = round((time.perf_counter() - _IMPORT_T0) * 1000.0, 2)
+
 if __name__ == "__main__":
+    print(startup_report())
     app.run(host="0.0.0.0", debug=True)
@@ -0,0 +1,207 @@
+"""
+Bulkimport/-export av platser, rutter och priskategorier (CSV eller JSONL).
+
+Import läser filen rad för rad och validerar med samma regler som formuläret
+i Inställningar (parse_price_band). Geokodning och skrivning till Sheets görs
+av app.py (import_bulk) så att den här modulen inte behöver Flask/Google.
+
+CSV-format
+- places: Title, Address, Lat, Lng, Aliases
+- routes: en rad per priskategori; rader med samma Från/Till slås ihop till en rutt.
+  FromTitle, ToTitle, FromAddress, ToAddress, Title, FromLat, FromLng, ToLat, ToLng,
+  Label, Min, Max, Total, PricePerPerson
+
+JSONL-format: ett objekt per rad med samma nycklar som CSV, eller för rutter
+ett objekt per rutt med "prices": [{"label", "min", "max", "total", "price_per_person"}].
+"""
+import csv
+import io
+import json
+
+from sheets_repo import _norm, _num, _route_key, parse_price_band
+
+PLACE_COLUMNS = ["Title", "Address", "Lat", "Lng", "Aliases"]
+ROUTE_COLUMNS = [
+    "FromTitle", "ToTitle", "FromAddress", "ToAddress", "Title",
+    "FromLat", "FromLng", "ToLat", "ToLng",
+    "Label", "Min", "Max", "Total", "PricePerPerson",
+]
+FORMATS = ("csv", "jsonl")
+
+
+def detect_format(filename: str) -> str:
+    name = (filename or "").lower()
+    return "jsonl" if name.endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+def iter_records(stream, fmt="csv"):
+    """Strömma (radnummer, dict) ur en binär filström – hela filen läses aldrig in."""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if fmt == "jsonl":
+        for line_no, line in enumerate(text, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                rec = json.loads(line)
+            except ValueError as e:
+                yield line_no, {"__error__": f"Ogiltig JSON: {e}"}
+                continue
+            yield line_no, rec if isinstance(rec, dict) else {"__error__": "Raden är inte ett objekt."}
+    else:
+        reader = csv.DictReader(text)
+        for rec in reader:
+            yield reader.line_num, rec
+
+
+def _get(rec, *names):
+    """Första icke-tomma värdet för någon av nycklarna (CSV-rubrik eller JSON-nyckel)."""
+    for n in names:
+        v = rec.get(n)
+        if v not in (None, ""):
+            return v.strip() if isinstance(v, str) else v
+    return ""
+
+
+class ImportReport:
+    """Sammanställning av en import: vad som lades till, hoppades över och varför."""
+
+    def __init__(self):
+        self.added = 0
+        self.duplicates = []
+        self.errors = []  # [(radnummer, meddelande)]
+        self.geocoded = 0
+
+    def error(self, line_no, msg):
+        self.errors.append((line_no, msg))
+
+    def summary(self) -> str:
+        parts = [f"{self.added} tillagda"]
+        if self.duplicates:
+            parts.append(f"{len(self.duplicates)} dubbletter")
+        if self.geocoded:
+            parts.append(f"{self.geocoded} geokodade")
+        if self.errors:
+            first = "; ".join(f"rad {n}: {m}" for n, m in self.errors[:5])
+            parts.append(f"{len(self.errors)} fel ({first}{' …' if len(self.errors) > 5 else ''})")
+        return ", ".join(parts)
+
+
+def read_places(records, existing_titles, report):
+    """Validera platser. existing_titles = normaliserade titlar som redan finns."""
+    seen = set(existing_titles)
+    out = []
+    for line_no, rec in records:
+        if "__error__" in rec:
+            report.error(line_no, rec["__error__"])
+            continue
+        title = str(_get(rec, "Title", "title"))
+        address = str(_get(rec, "Address", "address"))
+        if not title or not address:
+            report.error(line_no, "Titel och adress krävs.")
+            continue
+        if _norm(title) in seen:
+            report.duplicates.append(title)
+            continue
+        seen.add(_norm(title))
+        out.append({
+            "title": title,
+            "address": address,
+            "lat": _num(_get(rec, "Lat", "lat")),
+            "lng": _num(_get(rec, "Lng", "lng")),
+            "aliases": str(_get(rec, "Aliases", "aliases")),
+        })
+    return out
+
+
+def _band_from(rec):
+    return parse_price_band(
+        _get(rec, "Label", "label"),
+        _get(rec, "Min", "min"),
+        _get(rec, "Max", "max"),
+        _get(rec, "Total", "total"),
+        _get(rec, "PricePerPerson", "price_per_person"),
+    )
+
+
+def read_routes(records, existing_keys, report):
+    """
+    Validera rutter och slå ihop priskategorier per rutt (_route_key).
+    En rutt med minst en ogiltig prisrad tas inte med alls.
+    """
+    routes = {}
+    broken = set()
+    for line_no, rec in records:
+        if "__error__" in rec:
+            report.error(line_no, rec["__error__"])
+            continue
+        from_title = str(_get(rec, "FromTitle", "from_title", "from"))
+        to_title = str(_get(rec, "ToTitle", "to_title", "to"))
+        if not from_title or not to_title:
+            report.error(line_no, "Både 'Från' och 'Till' krävs för rutt.")
+            continue
+        key = _route_key(from_title, to_title)
+        if key in existing_keys:
+            if key not in report.duplicates:
+                report.duplicates.append(key)
+            continue
+
+        route = routes.get(key)
+        if route is None:
+            route = routes[key] = {
+                "from_title": from_title,
+                "to_title": to_title,
+                "from_address": str(_get(rec, "FromAddress", "from_address")),
+                "to_address": str(_get(rec, "ToAddress", "to_address")),
+                "title": str(_get(rec, "Title", "title")) or f"{from_title} → {to_title}",
+                "from_lat": _num(_get(rec, "FromLat", "from_lat")),
+                "from_lng": _num(_get(rec, "FromLng", "from_lng")),
+                "to_lat": _num(_get(rec, "ToLat", "to_lat")),
+                "to_lng": _num(_get(rec, "ToLng", "to_lng")),
+                "prices": [],
+            }
+        try:
+            if isinstance(rec.get("prices"), list):
+                route["prices"].extend(_band_from(p) for p in rec["prices"])
+            elif _get(rec, "Label", "label", "Min", "min"):
+                route["prices"].append(_band_from(rec))
+        except ValueError as e:
+            report.error(line_no, str(e))
+            broken.add(key)
+    return [r for k, r in routes.items() if k not in broken]
+
+
+# --------- Export (strömmande) ----------
+def _csv_line(values) -> str:
+    buf = io.StringIO()
+    csv.writer(buf).writerow(["" if v is None else v for v in values])
+    return buf.getvalue()
+
+
+def export_places(places, fmt="csv"):
+    """Generator med en rad i taget – places = Places-rader från snapshoten."""
+    if fmt == "csv":
+        yield _csv_line(PLACE_COLUMNS)
+    for p in places:
+        row = [p.get(c, "") for c in PLACE_COLUMNS]
+        if fmt == "csv":
+            yield _csv_line(row)
+        else:
+            yield json.dumps(dict(zip(PLACE_COLUMNS, row)), ensure_ascii=False) + "\n"
+
+
+def export_routes(routes, fmt="csv"):
+    """Generator – CSV: en rad per priskategori, JSONL: ett objekt per rutt."""
+    if fmt == "csv":
+        yield _csv_line(ROUTE_COLUMNS)
+    for r in routes:
+        base = [r.get("from"), r.get("to"), r.get("from_address"), r.get("to_address"), r.get("title"),
+                r.get("from_lat"), r.get("from_lng"), r.get("to_lat"), r.get("to_lng")]
+        if fmt == "csv":
+            for p in r.get("prices") or [{}]:
+                yield _csv_line(base + [p.get("label"), p.get("min"), p.get("max"),
+                                        p.get("total"), p.get("price_per_person")])
+        else:
+            obj = dict(zip(ROUTE_COLUMNS[:9], base))
+            obj["prices"] = [dict(p) for p in r.get("prices") or []]
+            yield json.dumps(obj, ensure_ascii=False) + "\n"
@@ -0,0 +1,167 @@
+"""
+Tidsbudget för offertvägen + hedgade uppströmsanrop.
+
+- budget(sekunder): sätter en deadline för resten av requesten (contextvar,
+  så samtidiga requests i samma process har var sin).
+- remaining(): sekunder kvar – används som timeout mot Google och vid väntan
+  i single_flight.
+- hedged(): kör ett anrop och skickar ETT dubblettanrop om svaret dröjer
+  längre än p95 för endpointen; det första lyckade svaret vinner.
+  Poolen dimensioneras med configure() (app.py: efter gunicorns trådantal).
+  Är halva poolen upptagen – t.ex. förlorande försök som väntar ut en seg
+  Google – hoppas dubblettanropet över, så att nya offerter inte köar bakom dem.
+"""
+import contextvars
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+_DEADLINE = contextvars.ContextVar("deadline", default=None)
+
+
+class BudgetExceeded(TimeoutError):
+    """Tidsbudgeten för requesten är slut."""
+
+
+@contextmanager
+def budget(seconds):
+    """Deadline om seconds sekunder (eller en tidigare, om en yttre budget redan gäller)."""
+    deadline = time.monotonic() + float(seconds)
+    outer = _DEADLINE.get()
+    token = _DEADLINE.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+
+def remaining(default=None):
+    """Sekunder kvar av budgeten (minst 0), eller default om ingen budget gäller."""
+    deadline = _DEADLINE.get()
+    if deadline is None:
+        return default
+    return max(deadline - time.monotonic(), 0.0)
+
+
+def timeout(cap):
+    """Timeout för ett uppströmsanrop: cap, men aldrig längre än budgeten. 0 → BudgetExceeded."""
+    left = remaining(cap)
+    if left <= 0:
+        raise BudgetExceeded()
+    return min(cap, left)
+
+
+class LatencyTracker:
+    """Glidande fönster med de senaste svarstiderna (sekunder) för en endpoint."""
+
+    def __init__(self, window=200, min_samples=20):
+        self._samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def add(self, seconds):
+        self._samples.append(seconds)
+
+    def p95(self):
+        """p95 i sekunder, None tills fönstret har min_samples värden."""
+        samples = sorted(self._samples)
+        if len(samples) < self.min_samples:
+            return None
+        return samples[max(1, math.ceil(0.95 * len(samples))) - 1]
+
+
+_POOL = {"executor": None, "max_workers": 16}
+_STATS = {"calls": 0, "hedges": 0, "hedge_wins": 0, "hedges_skipped": 0, "in_flight": 0}
+_STATS_LOCK = threading.Lock()
+
+
+def configure(max_workers):
+    """Sätt poolens storlek (före första anropet – poolen skapas vid behov)."""
+    _POOL["max_workers"] = max(int(max_workers), 2)
+
+
+def _executor():
+    executor = _POOL["executor"]
+    if executor is None:
+        with _STATS_LOCK:
+            executor = _POOL["executor"]
+            if executor is None:
+                executor = _POOL["executor"] = ThreadPoolExecutor(
+                    max_workers=_POOL["max_workers"], thread_name_prefix="hedge"
+                )
+    return executor
+
+
+def _count(name, n=1):
+    with _STATS_LOCK:
+        _STATS[name] += n
+
+
+def _pool_busy():
+    """Minst halva poolen kör redan anrop → inga dubblettanrop."""
+    return _STATS["in_flight"] >= _POOL["max_workers"] // 2
+
+
+def stats():
+    with _STATS_LOCK:
+        return dict(_STATS, pool_size=_POOL["max_workers"])
+
+
+def hedged(fn, tracker, timeout_s, default_delay=1.0, min_delay=0.05):
+    """
+    Kör fn() med högst timeout_s sekunders väntan. Har inget svar kommit efter
+    trackerns p95 (default_delay innan det finns statistik) – eller misslyckades
+    första försöket – skickas ett andra försök. Första lyckade svaret returneras;
+    misslyckas båda kastas det sista felet, tar tiden slut kastas BudgetExceeded.
+    Försök som förlorar får köra klart i bakgrunden (de har egen timeout); de som
+    ännu inte startat avbryts. Dubblettanrop görs inte när poolen är upptagen.
+    """
+    def attempt():
+        _count("in_flight")
+        try:
+            t0 = time.monotonic()
+            result = fn()
+            tracker.add(time.monotonic() - t0)
+            return result
+        finally:
+            _count("in_flight", -1)
+
+    pool = _executor()
+    start = time.monotonic()
+    end = start + timeout_s
+    hedge_at = start + max(tracker.p95() or default_delay, min_delay)
+    _count("calls")
+    first = pool.submit(attempt)
+    pending = {first}
+    hedged_once = False
+    last_error = None
+    try:
+        while True:
+            now = time.monotonic()
+            if not hedged_once and (not pending or now >= hedge_at) and now < end:
+                hedged_once = True
+                if _pool_busy() and pending:
+                    _count("hedges_skipped")
+                else:
+                    pending.add(pool.submit(attempt))
+                    _count("hedges")
+            if not pending:
+                raise last_error
+            if now >= end:
+                raise BudgetExceeded()
+            until = end if hedged_once else min(end, hedge_at)
+            done, pending = wait(pending, timeout=max(until - now, 0.0), return_when=FIRST_COMPLETED)
+            for f in done:
+                try:
+                    result = f.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                if f is not first:
+                    _count("hedge_wins")
+                return result
+    finally:
+        for f in pending:
+            f.cancel()  # bara försök som ännu står i kö – pågående anrop kan inte avbrytas
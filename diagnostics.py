@@ -0,0 +1,143 @@
+"""
+Diagnostik: latens (p50/p95/p99) och kvotfel för varje läsväg mot Sheets och
+varje Google Maps-endpoint som appen använder. Endast läsande anrop – inget
+skrivs till kalkylarket (ersätter test_sheet.py).
+
+En probe är (namn, fn) där fn() gör ETT uppströmsanrop och returnerar en
+status-sträng ("OK", "ZERO_RESULTS", "OVER_QUERY_LIMIT", …).
+Undantag räknas som fel; HTTP 429 räknas som kvotfel.
+"""
+import math
+import time
+
+import requests
+
+MAPS_BASE = "https://maps.googleapis.com/maps/api"
+OK_STATUSES = {"OK", "ZERO_RESULTS"}
+QUOTA_STATUSES = {"OVER_QUERY_LIMIT", "OVER_DAILY_LIMIT", "RESOURCE_EXHAUSTED", "HTTP 429"}
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank-percentil ur en sorterad lista, None om den är tom."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def status_of(exc):
+    """Status-sträng för ett undantag ("HTTP 429", "ConnectionError", …)."""
+    code = getattr(getattr(exc, "response", None), "status_code", None)
+    if code is not None:
+        return f"HTTP {code}"
+    return type(exc).__name__
+
+
+def measure(name, fn, samples):
+    """Kör fn samples gånger i följd och sammanställ latens + statusar."""
+    times, statuses = [], {}
+    for _ in range(samples):
+        t0 = time.perf_counter()
+        try:
+            status = fn() or "OK"
+        except Exception as e:
+            status = status_of(e)
+        times.append((time.perf_counter() - t0) * 1000.0)
+        statuses[status] = statuses.get(status, 0) + 1
+    times.sort()
+    ok = sum(n for s, n in statuses.items() if s in OK_STATUSES)
+    quota = sum(n for s, n in statuses.items() if s in QUOTA_STATUSES)
+    return {
+        "name": name,
+        "samples": samples,
+        "ok": ok,
+        "quota_errors": quota,
+        "statuses": statuses,
+        "p50_ms": round(percentile(times, 50), 1) if times else None,
+        "p95_ms": round(percentile(times, 95), 1) if times else None,
+        "p99_ms": round(percentile(times, 99), 1) if times else None,
+        "max_ms": round(times[-1], 1) if times else None,
+    }
+
+
+def run(probes, samples=5):
+    """
+    Mät alla probes. Sammanfattningen skiljer kapacitet från avbrott:
+    - "quota": minst en probe fick kvotfel (övriga svar fungerar)
+    - "down": någon probe lyckades aldrig, utan kvotfel
+    - "ok": allt svarade
+    """
+    results = [measure(name, fn, samples) for name, fn in probes]
+    quota_limited = [r["name"] for r in results if r["quota_errors"]]
+    down = [r["name"] for r in results if not r["ok"] and not r["quota_errors"]]
+    return {
+        "status": "down" if down else "quota" if quota_limited else "ok",
+        "samples": samples,
+        "quota_limited": quota_limited,
+        "failing": down,
+        "probes": results,
+    }
+
+
+def format_report(report) -> str:
+    """Textrapport för CLI."""
+    lines = [f"{'probe':<24}{'ok':>7}{'p50':>9}{'p95':>9}{'p99':>9}  status"]
+    for r in report["probes"]:
+        statuses = ", ".join(f"{s}×{n}" for s, n in sorted(r["statuses"].items()))
+        lines.append(
+            f"{r['name']:<24}{r['ok']:>3}/{r['samples']:<3}"
+            f"{r['p50_ms']:>9.0f}{r['p95_ms']:>9.0f}{r['p99_ms']:>9.0f}  {statuses}"
+        )
+    lines.append(f"Status: {report['status']}")
+    if report["quota_limited"]:
+        lines.append("Kvotfel: " + ", ".join(report["quota_limited"]))
+    if report["failing"]:
+        lines.append("Svarar inte: " + ", ".join(report["failing"]))
+    return "\n".join(lines)
+
+
+# --------- Google Maps ----------
+def _maps_get(path, params, timeout):
+    def call():
+        data = requests.get(f"{MAPS_BASE}/{path}", params=params, timeout=timeout).json()
+        return data.get("status", "UNKNOWN")
+    return call
+
+
+def maps_probes(api_key, origin, destination, address, timeout=20):
+    """
+    En probe per Maps-endpoint som app.py anropar (samma parametrar, inga cachar).
+    origin/destination = 'lat,lng', address = fritext för Geocoding/Autocomplete.
+    """
+    probes = [
+        ("maps.geocode", _maps_get("geocode/json", {
+            "address": address, "key": api_key, "language": "sv",
+            "components": "country:SE|country:NO",
+        }, timeout)),
+        ("maps.directions", _maps_get("directions/json", {
+            "origin": origin, "destination": destination, "mode": "driving", "key": api_key,
+        }, timeout)),
+        ("maps.distancematrix", _maps_get("distancematrix/json", {
+            "origins": origin, "destinations": destination, "mode": "driving", "key": api_key,
+        }, timeout)),
+        ("maps.autocomplete", _maps_get("place/autocomplete/json", {
+            "input": address, "types": "geocode", "components": "country:se|country:no",
+            "language": "sv", "key": api_key,
+        }, timeout)),
+    ]
+
+    # Place Details behöver ett place_id – hämtas en gång (räknas inte i mätningen)
+    place_id = None
+    try:
+        data = requests.get(f"{MAPS_BASE}/place/autocomplete/json", params={
+            "input": address, "language": "sv", "key": api_key,
+        }, timeout=timeout).json()
+        preds = data.get("predictions") or []
+        place_id = preds[0].get("place_id") if preds else None
+    except Exception as e:
+        print("⚠️ Diagnostik: kunde inte hämta place_id:", e)
+    if place_id:
+        probes.append(("maps.place_details", _maps_get("place/details/json", {
+            "place_id": place_id, "fields": "geometry,formatted_address", "language": "sv", "key": api_key,
+        }, timeout)))
+    return probes
@@ -0,0 +1,26 @@
+"""
+Gunicorn-konfiguration (läses automatiskt från arbetskatalogen: `gunicorn app:app`).
+
+Appen importeras och förvärms i mastern innan workers forkas (preload_app +
+when_ready → app.prewarm), så varje worker ärver Sheets-/auth-stacken, snapshoten
+och restidscachen i stället för att ladda dem själv vid första requesten.
+Bakgrundstrådar startas per worker vid första requesten (app.start_background_jobs).
+"""
+import os
+
+preload_app = True
+# Requesttrådar per worker (app.py dimensionerar hedge-poolen efter samma värde)
+threads = int(os.getenv("GUNICORN_THREADS", "1") or 1)
+
+
+def when_ready(server):
+    from app import prewarm
+
+    prewarm()
+
+
+def post_fork(server, worker):
+    # Ärvda HTTP-anslutningar till Sheets får inte delas mellan processer
+    from sheets_repo import after_fork
+
+    after_fork()
@@ -0,0 +1,153 @@
+"""
+Minnesindex över Places (byggs om en gång per Sheets-snapshot).
+- PlaceTrie: prefixsökning över titlar + alias för typeahead.
+- PlaceGrid: rutnät över koordinater för "närmaste kända plats inom X m".
+"""
+import math
+
+from sheets_repo import _norm
+
+EARTH_RADIUS_M = 6371000.0
+M_PER_DEG_LAT = 111320.0
+
+# Rangordning: titel-prefix före alias-prefix före ord inne i titel/alias
+RANK_TITLE, RANK_ALIAS, RANK_WORD = 0, 1, 2
+
+
+def _place_record(p):
+    """Places-rad (get_all_records) → kompakt dict som skickas till klienten."""
+    return {
+        "id": p.get("PlaceID", ""),
+        "title": p.get("Title", ""),
+        "address": p.get("Address", ""),
+        "lat": p.get("Lat") if str(p.get("Lat", "")).strip() != "" else None,
+        "lng": p.get("Lng") if str(p.get("Lng", "")).strip() != "" else None,
+    }
+
+
+def _aliases(p):
+    return [a.strip() for a in str(p.get("Aliases", "") or "").split(",") if a.strip()]
+
+
+class PlaceTrie:
+    """
+    Prefixträd över Places-titlar och alias, normaliserade med _norm.
+    Varje nod håller {plats-index: bästa rang} för allt under noden,
+    så en sökning kostar O(len(prefix)) + sortering av träffarna.
+    """
+    __slots__ = ("places", "_root", "_exact")
+
+    def __init__(self, places):
+        self.places = []
+        self._root = ({}, {})
+        self._exact = {}
+        for p in places:
+            title = p.get("Title", "")
+            if not title:
+                continue
+            idx = len(self.places)
+            self.places.append(_place_record(p))
+
+            names = [(title, RANK_TITLE)] + [(a, RANK_ALIAS) for a in _aliases(p)]
+            for name, rank in names:
+                n = _norm(name)
+                if not n:
+                    continue
+                if rank == RANK_TITLE:
+                    self._exact[n] = idx
+                else:
+                    self._exact.setdefault(n, idx)
+                self._insert(n, idx, rank)
+                # Även ord inne i namnet ("flygplats" hittar "Östersund Flygplats")
+                for i, ch in enumerate(n):
+                    if ch == " " and i + 1 < len(n):
+                        self._insert(n[i + 1:], idx, RANK_WORD)
+
+    def _insert(self, text, idx, rank):
+        node = self._root
+        for ch in text:
+            children = node[0]
+            node = children.get(ch)
+            if node is None:
+                node = children[ch] = ({}, {})
+            hits = node[1]
+            if rank < hits.get(idx, RANK_WORD + 1):
+                hits[idx] = rank
+
+    def search(self, query, limit=8):
+        """Platser vars titel/alias (eller ett ord i dem) börjar med query."""
+        q = _norm(query)
+        if not q:
+            return []
+        node = self._root
+        for ch in q:
+            node = node[0].get(ch)
+            if node is None:
+                return []
+        ranked = sorted(node[1].items(), key=lambda kv: (kv[1], self.places[kv[0]]["title"]))
+        return [self.places[idx] for idx, _ in ranked[:limit]]
+
+    def lookup(self, text):
+        """Exakt träff på titel eller alias (normaliserat) → plats, annars None."""
+        idx = self._exact.get(_norm(text))
+        return self.places[idx] if idx is not None else None
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """Avstånd i meter mellan två koordinater."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lng2 - lng1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def parse_latlng(text):
+    """'lat,lng' → (lat, lng) som float, annars None."""
+    try:
+        lat_s, lng_s = str(text).split(",")
+        return float(lat_s), float(lng_s)
+    except (AttributeError, ValueError):
+        return None
+
+
+class PlaceGrid:
+    """
+    Rutnät (celler på radius_m i latitud) över Places med koordinater.
+    nearest() tittar bara i cellerna runt punkten → i praktiken konstant tid.
+    """
+    __slots__ = ("radius_m", "_cell_deg", "_cells")
+
+    def __init__(self, places, radius_m=250.0):
+        self.radius_m = float(radius_m)
+        self._cell_deg = self.radius_m / M_PER_DEG_LAT
+        self._cells = {}
+        for p in places:
+            rec = _place_record(p)
+            if rec["lat"] is None or rec["lng"] is None or not rec["title"]:
+                continue
+            try:
+                lat, lng = float(rec["lat"]), float(rec["lng"])
+            except (TypeError, ValueError):
+                continue
+            self._cells.setdefault(self._cell(lat, lng), []).append((lat, lng, rec))
+
+    def _cell(self, lat, lng):
+        return int(math.floor(lat / self._cell_deg)), int(math.floor(lng / self._cell_deg))
+
+    def nearest(self, lat, lng, radius_m=None):
+        """Närmaste plats inom radius_m (default: nätets radie) → (plats, meter) eller (None, None)."""
+        radius_m = min(float(radius_m or self.radius_m), self.radius_m)
+        if not self._cells:
+            return None, None
+        cy, cx = self._cell(lat, lng)
+        # En longitudgrad är kortare än en latitudgrad – titta på fler celler i x-led
+        dx = int(math.ceil(1.0 / max(math.cos(math.radians(lat)), 0.01)))
+        best, best_d = None, None
+        for y in range(cy - 1, cy + 2):
+            for x in range(cx - dx, cx + dx + 1):
+                for plat, plng, rec in self._cells.get((y, x), ()):
+                    d = haversine_m(lat, lng, plat, plng)
+                    if d <= radius_m and (best_d is None or d < best_d):
+                        best, best_d = rec, d
+        return best, best_d
@@ -0,0 +1,153 @@
+"""
+Offertjournal: varje beräknad offert som en JSON-rad i en lokal, append-only fil.
+
+Requesttråden gör bara deque.append() (atomiskt i CPython, inget lås);
+en bakgrundstråd tömmer bufferten, skriver till quotes.<pid>.jsonl och roterar
+filen till quotes-<tid>-<pid>.jsonl.gz när den blir större än max_bytes.
+Varje process (gunicorn-worker) har en egen aktiv fil, så ingen delar fil eller
+rotationsnamn med någon annan. Filer efter döda processer arkiveras av
+skrivartråden när den startar.
+Läs tillbaka med iter_entries() (arkiv äldst först, sedan aktiva filer), t.ex.
+för att värma cachar.
+"""
+import atexit
+import glob
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+from collections import deque
+
+ACTIVE_PATTERN = "quotes.*.jsonl"
+
+
+class QuoteJournal:
+    def __init__(self, directory, max_bytes=10 * 1024 * 1024, keep=20, flush_interval=1.0, maxlen=10000):
+        self.directory = directory
+        self.max_bytes = int(max_bytes)
+        self.keep = int(keep)
+        self.flush_interval = float(flush_interval)
+        self.dropped = 0
+        # maxlen: står skrivaren still tappas äldsta posterna i stället för att minnet växer
+        self._buf = deque(maxlen=maxlen)
+        self._write_lock = threading.Lock()
+        self._thread = None
+        self._pid = None  # processen som äger _thread (trådar följer inte med vid fork)
+
+    @property
+    def path(self):
+        return os.path.join(self.directory, f"quotes.{os.getpid()}.jsonl")
+
+    def record(self, entry):
+        """Lägg en post i bufferten (anropas i requesttråden – ingen I/O)."""
+        if len(self._buf) == self._buf.maxlen:
+            self.dropped += 1
+        self._buf.append(entry)
+        if self._pid != os.getpid():
+            self._start()
+
+    def _start(self):
+        with self._write_lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="quote-journal", daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def _archive_orphans(self):
+        """Arkivera aktiva filer vars process inte längre lever (t.ex. efter omstart)."""
+        for path in glob.glob(os.path.join(self.directory, ACTIVE_PATTERN)):
+            try:
+                pid = int(os.path.basename(path).split(".")[1])
+            except (IndexError, ValueError):
+                continue
+            if pid == os.getpid() or _alive(pid):
+                continue
+            with self._write_lock:
+                self._rotate(path)
+
+    def _run(self):
+        # Gamla filer kan vara stora – gzip:a dem här, aldrig i requesttråden
+        try:
+            self._archive_orphans()
+        except OSError as e:
+            print("⚠️ Offertjournal: kunde inte arkivera gamla filer:", e)
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print("⚠️ Offertjournal: skrivning misslyckades:", e)
+
+    def flush(self):
+        """Töm bufferten till disk och rotera vid behov."""
+        with self._write_lock:
+            if not self._buf:
+                return 0
+            os.makedirs(self.directory, exist_ok=True)
+            n = 0
+            with open(self.path, "a", encoding="utf-8") as f:
+                while self._buf:
+                    entry = self._buf.popleft()
+                    f.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+                    n += 1
+                size = f.tell()
+            if size >= self.max_bytes:
+                self._rotate(self.path)
+            return n
+
+    def _rotate(self, path):
+        """Komprimera path till ett arkiv. Någon annan som hann först → gör inget."""
+        pid = os.path.basename(path).split(".")[1]
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime())
+        target = os.path.join(self.directory, f"quotes-{stamp}-{pid}.jsonl.gz")
+        i = 1
+        while os.path.exists(target):
+            target = os.path.join(self.directory, f"quotes-{stamp}-{pid}-{i}.jsonl.gz")
+            i += 1
+        tmp = f"{path}.rotating-{os.getpid()}"
+        try:
+            os.replace(path, tmp)
+        except FileNotFoundError:
+            return
+        with open(tmp, "rb") as src, gzip.open(target + ".tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(target + ".tmp", target)
+        os.remove(tmp)
+        for old in self.archives()[:-self.keep or None]:
+            try:
+                os.remove(old)
+            except FileNotFoundError:  # en annan worker städade samtidigt
+                pass
+
+    def archives(self):
+        """Komprimerade filer, äldst först (tidsstämpeln i namnet sorterar rätt)."""
+        return sorted(glob.glob(os.path.join(self.directory, "quotes-*.jsonl.gz")))
+
+    def iter_entries(self):
+        """Alla poster på disk: arkiven äldst först, sedan aktiva filer. Trasiga rader hoppas över."""
+        paths = self.archives() + sorted(glob.glob(os.path.join(self.directory, ACTIVE_PATTERN)))
+        for path in paths:
+            opener = gzip.open if path.endswith(".gz") else open
+            try:
+                with opener(path, "rt", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            yield json.loads(line)
+                        except ValueError:
+                            continue
+            except OSError as e:
+                print("⚠️ Offertjournal: kunde inte läsa", path, e)
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
@@ -0,0 +1,219 @@
+"""
+Förberäknad offertmatris: restid, avstånd och pris per tariff för varje
+ordnat par av kända platser (Places), lagrad i EN binärfil som kan mmap:as.
+
+Filformat (little endian):
+    magic b"TQM1" | n (uint32) | k (uint32) | meta_len (uint32)
+    meta (JSON, utf-8) | utfyllnad till 4 byte
+    n*n*k float32 – cell (i, j) = [duration_min, distance_km, pris tariff 1..k-2]
+Saknade celler är NaN. Filen ersätts atomiskt (unik tmp-fil + os.replace), så
+läsare i andra workers ser antingen den gamla eller den nya matrisen.
+Byggen låses med flock på <path>.lock, så bara en process i taget bygger en
+matris (och spenderar Distance Matrix-budget på den).
+"""
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+from array import array
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows – ingen låsning mellan processer
+    fcntl = None
+
+MAGIC = b"TQM1"
+_HEADER = struct.Struct("<4sIII")
+BASE_FIELDS = ("duration_min", "distance_km")
+
+
+def _coord_sig(lat, lng):
+    return f"{float(lat):.6f},{float(lng):.6f}"
+
+
+class QuoteMatrix:
+    """Läsvy över en matrisfil. lookup() är en uppslagning + en struct-läsning."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.n, self.k, meta_len = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Inte en offertmatris: {path}")
+        meta_start = _HEADER.size
+        self.meta = json.loads(self._mm[meta_start:meta_start + meta_len].decode("utf-8"))
+        self._data_start = meta_start + meta_len + (-(meta_start + meta_len) % 4)
+        self._cell = struct.Struct(f"<{self.k}f")
+        self.place_ids = self.meta["place_ids"]
+        self.tariffs = self.meta["tariffs"]
+        self.tariff_version = self.meta["tariff_version"]
+        self._pos = {pid: i for i, pid in enumerate(self.place_ids)}
+
+    def cell(self, i, j):
+        return self._cell.unpack_from(self._mm, self._data_start + (i * self.n + j) * self.k * 4)
+
+    def lookup(self, from_id, to_id):
+        """{"duration_min", "distance_km", "prices": {tariff: pris}} eller None om paret saknas."""
+        i, j = self._pos.get(from_id), self._pos.get(to_id)
+        if i is None or j is None:
+            return None
+        values = self.cell(i, j)
+        if math.isnan(values[0]) or math.isnan(values[1]):
+            return None
+        prices = None
+        if not any(math.isnan(v) for v in values[2:]):
+            prices = {name: round(v) for name, v in zip(self.tariffs, values[2:])}
+        return {"duration_min": values[0], "distance_km": values[1], "prices": prices}
+
+
+def load(path):
+    """Öppna en matrisfil, None om den saknas eller är trasig."""
+    try:
+        return QuoteMatrix(path)
+    except (OSError, ValueError, KeyError) as e:
+        if not isinstance(e, FileNotFoundError):
+            print("⚠️ Offertmatris kunde inte läsas:", e)
+        return None
+
+
+@contextmanager
+def _build_lock(path):
+    """Exklusivt lås mellan processer; ger False om någon annan redan bygger."""
+    if fcntl is None:
+        yield True
+        return
+    with open(path + ".lock", "a") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def build(path, places, tariff_names, tariff_version, price_fn, fetch_fn, budget, block=10):
+    """
+    Som _build(), men bara en process i taget per matrisfil.
+    Returnerar None om ett annat bygge redan pågår.
+    """
+    with _build_lock(path) as acquired:
+        if not acquired:
+            return None
+        return _build(path, places, tariff_names, tariff_version, price_fn, fetch_fn, budget, block)
+
+
+def _build(path, places, tariff_names, tariff_version, price_fn, fetch_fn, budget, block):
+    """
+    Bygg (om) matrisen inkrementellt.
+    - places: [(place_id, lat, lng)]
+    - price_fn(duration_min, distance_km) → [pris per tariff i tariff_names-ordning]
+    - fetch_fn(origins, destinations) → [[(duration_min, distance_km) | None]] ('lat,lng'-listor)
+    - budget: max antal fetch_fn-anrop (block×block element per anrop)
+    Celler från förra matrisen återanvänds när båda platsernas koordinater är oförändrade;
+    priser räknas alltid om (billigt) så ändrade tariffer kräver inga API-anrop.
+    Returnerar statistik-dict.
+    """
+    ids = [p[0] for p in places]
+    coords = [_coord_sig(p[1], p[2]) for p in places]
+    n, k = len(ids), len(BASE_FIELDS) + len(tariff_names)
+    nan = float("nan")
+    data = array("f", [nan]) * (n * n * k)
+
+    # 1) Återanvänd restid/avstånd från förra matrisen
+    reused = 0
+    prev = load(path)
+    if prev is not None:
+        prev_coords = prev.meta.get("coords", {})
+        prev_pos = {pid: i for i, pid in enumerate(prev.place_ids)
+                    if prev_coords.get(pid) is not None}
+        keep = [(i, prev_pos[pid]) for i, pid in enumerate(ids)
+                if pid in prev_pos and prev_coords[pid] == coords[i]]
+        for i, pi in keep:
+            for j, pj in keep:
+                if i == j:
+                    continue
+                dur, dist = prev.cell(pi, pj)[:2]
+                if not math.isnan(dur):
+                    off = (i * n + j) * k
+                    data[off], data[off + 1] = dur, dist
+                    reused += 1
+
+    # 2) Hämta saknade par blockvis inom budget
+    requests_used, fetched = 0, 0
+    for oi in range(0, n, block):
+        for di in range(0, n, block):
+            o_range = range(oi, min(oi + block, n))
+            d_range = range(di, min(di + block, n))
+            missing = any(i != j and math.isnan(data[(i * n + j) * k]) for i in o_range for j in d_range)
+            if not missing:
+                continue
+            if requests_used >= budget:
+                break
+            requests_used += 1
+            try:
+                result = fetch_fn([coords[i] for i in o_range], [coords[j] for j in d_range])
+            except Exception as e:
+                print("⚠️ Offertmatris: hämtning misslyckades:", e)
+                continue
+            for a, i in enumerate(o_range):
+                for b, j in enumerate(d_range):
+                    cell = result[a][b] if result and a < len(result) and b < len(result[a]) else None
+                    if i != j and cell and cell[0] is not None and cell[1] is not None:
+                        off = (i * n + j) * k
+                        data[off], data[off + 1] = cell[0], cell[1]
+                        fetched += 1
+
+    # 3) Priser för alla celler med restid
+    filled = 0
+    for i in range(n):
+        for j in range(n):
+            off = (i * n + j) * k
+            if math.isnan(data[off]):
+                continue
+            filled += 1
+            for t, price in enumerate(price_fn(data[off], data[off + 1])):
+                data[off + 2 + t] = price
+
+    # 4) Skriv atomiskt
+    meta = json.dumps({
+        "place_ids": ids,
+        "coords": dict(zip(ids, coords)),
+        "tariffs": list(tariff_names),
+        "tariff_version": tariff_version,
+        "built_at": time.time(),
+    }, ensure_ascii=False).encode("utf-8")
+    if sys.byteorder == "big":
+        data.byteswap()
+    fd, tmp = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(path)), prefix=os.path.basename(path) + ".", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, n, k, len(meta)))
+            f.write(meta)
+            f.write(b"\0" * (-(_HEADER.size + len(meta)) % 4))
+            data.tofile(f)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+    total = n * (n - 1)
+    return {
+        "places": n,
+        "pairs": total,
+        "filled": filled,
+        "reused": reused,
+        "fetched": fetched,
+        "requests": requests_used,
+        "complete": filled >= total,
+    }
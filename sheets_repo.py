@@ -1,41 +1,86 @@
 import json
-import os, uuid
+import os, re, sys, threading, uuid
 from dotenv import load_dotenv
-import gspread
-from google.oauth2.service_account import Credentials
+
+import tenants
+
+# gspread och google-auth importeras först när ett kalkylark öppnas (_open_sheet),
+# så att import av modulen (och app.py) inte betalar för Sheets-stacken.
 
 SCOPES = [
     "https://www.googleapis.com/auth/spreadsheets",
     "https://www.googleapis.com/auth/drive",
 ]
 
-def _open_sheet():
+def _spreadsheet_id():
+    """Aktuell tenants kalkylark – alla cachar nedan är nycklade på detta id."""
     load_dotenv()
+    return tenants.spreadsheet_id()
+
+def _credentials():
+    from google.oauth2.service_account import Credentials
     # 1) Inline JSON? (om du hellre vill lägga hela JSON:en som env-variabel)
     info = os.getenv("GOOGLE_SERVICE_ACCOUNT_INFO")
     if info:
-        creds = Credentials.from_service_account_info(json.loads(info), scopes=SCOPES)
-    else:
-        # 2) Filväg via env
-        key_path = os.getenv("GOOGLE_SERVICE_ACCOUNT_JSON")
-        # 2a) Fallback till Render's standard path om inget satt
-        if not key_path:
-            default_secret = "/etc/secrets/topptaxi-sa.json"
-            if os.path.exists(default_secret):
-                key_path = default_secret
-        if not key_path or not os.path.exists(key_path):
-            raise FileNotFoundError(f"Service account JSON not found at: {key_path or '(unset)'}")
-        creds = Credentials.from_service_account_file(key_path, scopes=SCOPES)
-
-    spreadsheet_id = os.getenv("GOOGLE_SHEETS_SPREADSHEET_ID")
-    gc = gspread.authorize(creds)
-    return gc.open_by_key(spreadsheet_id)
+        return Credentials.from_service_account_info(json.loads(info), scopes=SCOPES)
+    # 2) Filväg via env
+    key_path = os.getenv("GOOGLE_SERVICE_ACCOUNT_JSON")
+    # 2a) Fallback till Render's standard path om inget satt
+    if not key_path:
+        default_secret = "/etc/secrets/topptaxi-sa.json"
+        if os.path.exists(default_secret):
+            key_path = default_secret
+    if not key_path or not os.path.exists(key_path):
+        raise FileNotFoundError(f"Service account JSON not found at: {key_path or '(unset)'}")
+    return Credentials.from_service_account_file(key_path, scopes=SCOPES)
+
+# Öppnade kalkylark per spreadsheet-id – auth + open_by_key görs en gång per process
+_SHEETS = {}
+_SHEETS_LOCK = threading.Lock()
 
+def _open_sheet():
+    spreadsheet_id = _spreadsheet_id()
+    sh = _SHEETS.get(spreadsheet_id)
+    if sh is None:
+        with _SHEETS_LOCK:
+            sh = _SHEETS.get(spreadsheet_id)
+            if sh is None:
+                import gspread
+                gc = gspread.authorize(_credentials())
+                sh = _SHEETS[spreadsheet_id] = gc.open_by_key(spreadsheet_id)
+    return sh
+
+
+def prewarm():
+    """
+    Öppna kalkylarket (t.ex. i gunicorn-mastern före fork) – det importerar även
+    gspread och google-auth, så workers ärver hela Sheets/auth-stacken.
+    """
+    return _open_sheet()
+
+def after_fork():
+    """
+    Efter fork: släpp ärvda HTTP-anslutningar så att workers inte delar sockets
+    med mastern. Kalkylarket och token behålls – nya anslutningar öppnas vid behov.
+    """
+    for sh in list(_SHEETS.values()):
+        try:
+            sh.client.session.close()  # Spreadsheet.client är gspreads HTTPClient
+        except OSError as e:
+            print("⚠️ Kunde inte stänga ärvd Sheets-session:", e)
+
+def forget(spreadsheet_id):
+    """Släpp öppnat kalkylark och index för ett kalkylark (tenant som lämnat minnet)."""
+    with _SHEETS_LOCK:
+        _SHEETS.pop(spreadsheet_id, None)
+    _ROUTE_KEYS.pop(spreadsheet_id, None)
+    _ROW_INDEX.pop(spreadsheet_id, None)
 
 def _ws(sh, name):
+    from gspread.exceptions import WorksheetNotFound
     try:
         return sh.worksheet(name)
-    except gspread.exceptions.WorksheetNotFound:
+    except WorksheetNotFound:
         return None
 
 def _get_all(ws):
@@ -50,6 +95,229 @@ def _norm(s: str) -> str:
 def _route_key(from_title: str, to_title: str) -> str:
     return f"{_norm(from_title)}→{_norm(to_title)}"
 
+def _num(v):
+    """Cell → float, tom/ogiltig cell → None."""
+    if v is None or str(v).strip() == "":
+        return None
+    try:
+        return float(str(v).replace(",", "."))
+    except ValueError:
+        return None
+
+def _ensure_columns(ws, names):
+    """Se till att kolumnerna finns i rubrikraden (läggs sist). Returnerar rubrikraden."""
+    header = ws.row_values(1)
+    missing = [n for n in names if n not in header]
+    if missing:
+        need = len(header) + len(missing)
+        if need > ws.col_count:
+            ws.add_cols(need - ws.col_count)
+        for i, name in enumerate(missing, start=len(header) + 1):
+            ws.update_cell(1, i, name)
+        header = header + missing
+    return header
+
+# Ursprungliga Routes-kolumner, skrivs positionellt (RouteID … Key)
+ROUTE_BASE_COLUMNS = 12
+# Kolumner som lagts till i efterhand i Routes (restid/avstånd sparas vid skapande)
+ROUTE_TRAVEL_COLUMNS = ["DurationMin", "DistanceKm"]
+
+# --------- Radindex (PlaceID/Title/RouteID → radnummer) ----------
+# Byggs per snapshot i load_all() så att radering/uppdatering kan gå direkt på
+# rätt rad. Varje träff verifieras med EN radläsning; stämmer den inte (någon
+# annan har ändrat bladet) faller vi tillbaka på en full läsning.
+_ROW_INDEX = {}
+
+def _build_row_index(places, routes):
+    refs = {}
+    for r in routes:
+        # Normaliserad titel (som i _route_key) – då räknas även rader vi bara sett som nycklar
+        for t in {_norm(str(r.get("FromTitle", ""))), _norm(str(r.get("ToTitle", "")))}:
+            if t:
+                refs[t] = refs.get(t, 0) + 1
+    place_by_title = {}
+    for i, p in enumerate(places, start=2):
+        place_by_title.setdefault(str(p.get("Title", "")), i)
+    return {
+        "places_header": list(places[0].keys()) if places else None,
+        "routes_header": list(routes[0].keys()) if routes else None,
+        "place_row_by_id": {str(p.get("PlaceID", "")): i for i, p in enumerate(places, start=2) if p.get("PlaceID")},
+        "place_row_by_title": place_by_title,
+        "route_row_by_id": {str(r.get("RouteID", "")): i for i, r in enumerate(routes, start=2) if r.get("RouteID")},
+        # Sista raden i Routes enligt snapshoten – append efter den verifieras mot nyare rader
+        "routes_last_row": len(routes) + 1,
+        "place_refs": refs,
+    }
+
+def _row_index():
+    """Radindexet för nuvarande kalkylark (tomt tills load_all() körts)."""
+    return _ROW_INDEX.setdefault(_spreadsheet_id(), {
+        "places_header": None, "routes_header": None,
+        "place_row_by_id": {}, "place_row_by_title": {}, "route_row_by_id": {},
+        "routes_last_row": None, "place_refs": None,
+    })
+
+def _find_row(ws, index, header, col_name, value):
+    """
+    Första raden där col_name == value → (radnummer, radvärden, rubrikrad).
+    Indexträffen verifieras med en radläsning; annars full läsning (och indexet rättas).
+    (None, None, rubrikrad) om raden inte finns.
+    """
+    row = index.get(value)
+    if row and header and col_name in header:
+        values = ws.row_values(row)
+        c = header.index(col_name)
+        if len(values) > c and values[c] == value:
+            return row, values, header
+
+    all_values = ws.get_all_values()
+    header = all_values[0]
+    c = header.index(col_name)
+    for i, r in enumerate(all_values[1:], start=2):
+        if len(r) > c and r[c] == value:
+            index[value] = i
+            return i, r, header
+    return None, None, header
+
+def _rows_deleted(index, deleted_rows):
+    """Justera radnummer i ett index efter att rader tagits bort."""
+    deleted = sorted(deleted_rows)
+    for key, row in list(index.items()):
+        if row in deleted:
+            del index[key]
+        else:
+            index[key] = row - sum(1 for d in deleted if d < row)
+
+def _appended_rows(resp):
+    """Radnummer som ett append-anrop skrev (ur updatedRange), tom lista om okänt."""
+    try:
+        rng = resp["updates"]["updatedRange"].split("!")[-1]
+        first, _, last = rng.partition(":")
+        start = int(re.sub(r"\D", "", first))
+        end = int(re.sub(r"\D", "", last or first))
+        return list(range(start, end + 1))
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return []
+
+def _add_route_refs(*titles):
+    refs = _row_index()["place_refs"]
+    if refs is not None:
+        for t in {_norm(t) for t in titles}:
+            if t:
+                refs[t] = refs.get(t, 0) + 1
+
+# --------- Kompakta, oföränderliga poster för snapshoten ----------
+class _Record:
+    """
+    Oföränderlig post med __slots__ som läses som en dict (r["from"], r.get("to"),
+    "total" in p, dict(r)) så att befintlig kod och mallar fungerar oförändrat.
+    Valfria fält som är None räknas som saknade nycklar (som i de gamla dictarna).
+    Nyckel = attributnamn som standard; Route/ReversedRoute översätter i _value().
+    """
+    __slots__ = ()
+    _keys = ()
+    _optional = frozenset()
+
+    def _value(self, key):
+        return getattr(self, key)
+
+    def __getitem__(self, key):
+        if key not in self._keys:
+            raise KeyError(key)
+        if key in self._optional and self._value(key) is None:
+            raise KeyError(key)
+        return self._value(key)
+
+    def get(self, key, default=None):
+        if key not in self._keys:
+            return default
+        v = self._value(key)
+        return default if v is None and key in self._optional else v
+
+    def __contains__(self, key):
+        return key in self._keys and not (key in self._optional and self._value(key) is None)
+
+    def keys(self):
+        return [k for k in self._keys if k in self]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} är oföränderlig")
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)!r})"
+
+
+class PriceBand(_Record):
+    __slots__ = ("label", "min", "max", "total", "price_per_person")
+    _keys = __slots__
+    _optional = frozenset({"total", "price_per_person"})
+
+    def __init__(self, label, min, max=None, total=None, price_per_person=None):
+        for name, v in zip(self.__slots__, (label, min, max, total, price_per_person)):
+            object.__setattr__(self, name, v)
+
+
+# dict-nyckel → attribut ("from" är ett reserverat ord och kan inte vara en slot)
+_ROUTE_ATTRS = {
+    "route_id": "route_id", "from": "from_title", "to": "to_title",
+    "from_address": "from_address", "to_address": "to_address",
+    "from_lat": "from_lat", "from_lng": "from_lng", "to_lat": "to_lat", "to_lng": "to_lng",
+    "prices": "prices", "key": "key", "title": "title",
+    "duration_min": "duration_min", "distance_km": "distance_km",
+}
+# Nycklar som byter plats i motsatt riktning
+_REVERSE_KEYS = {
+    "from": "to", "to": "from",
+    "from_address": "to_address", "to_address": "from_address",
+    "from_lat": "to_lat", "to_lat": "from_lat",
+    "from_lng": "to_lng", "to_lng": "from_lng",
+}
+
+
+class Route(_Record):
+    """En fastprisrutt ur Routes + RoutePrices (prices är en delad tuple av PriceBand)."""
+    __slots__ = tuple(_ROUTE_ATTRS.values())
+    _keys = tuple(_ROUTE_ATTRS)
+
+    def __init__(self, **values):
+        for key, attr in _ROUTE_ATTRS.items():
+            object.__setattr__(self, attr, values.get(key))
+
+    def _value(self, key):
+        return getattr(self, _ROUTE_ATTRS[key])
+
+    def reversed(self):
+        return ReversedRoute(self)
+
+
+class ReversedRoute(_Record):
+    """Lättvikts-vy av en Route i motsatt riktning – inga kopierade fält eller priser."""
+    __slots__ = ("_route",)
+    _keys = Route._keys
+
+    def __init__(self, route):
+        object.__setattr__(self, "_route", route)
+
+    def _value(self, key):
+        if key == "title":
+            # Sparad titel beskriver den sparade riktningen – bygg om den åt andra hållet
+            return f"{self._route._value('to')} → {self._route._value('from')}"
+        return self._route._value(_REVERSE_KEYS.get(key, key))
+
+    def reversed(self):
+        return self._route
+
+
+def _intern(v):
+    return sys.intern(str(v)) if v not in (None, "") else ""
+
+
 def load_all():
     """Läser Sheets och bygger färdiga rutter (inkl. RouteID)."""
     sh = _open_sheet()
@@ -66,56 +334,262 @@ def load_all():
         rid = p.get("RouteID")
         if not rid:
             continue
-        prices_by_route.setdefault(rid, []).append({
-            "label": p.get("Label", ""),
-            "min": int(p["Min"]) if str(p.get("Min","")).strip() != "" else 0,
-            "max": (int(p["Max"]) if str(p.get("Max","")).strip() != "" else None),
-            **({"total": int(p["Total"])} if str(p.get("Total","")).strip() != "" else {}),
-            **({"price_per_person": int(p["PricePerPerson"])} if str(p.get("PricePerPerson","")).strip() != "" else {}),
-        })
+        prices_by_route.setdefault(rid, []).append(PriceBand(
+            label=_intern(p.get("Label", "")),
+            min=int(p["Min"]) if str(p.get("Min","")).strip() != "" else 0,
+            max=(int(p["Max"]) if str(p.get("Max","")).strip() != "" else None),
+            total=(int(p["Total"]) if str(p.get("Total","")).strip() != "" else None),
+            price_per_person=(int(p["PricePerPerson"]) if str(p.get("PricePerPerson","")).strip() != "" else None),
+        ))
 
     built_routes = []
     for r in routes:
-        built_routes.append({
-            "route_id": r.get("RouteID",""),
-            "from": r.get("FromTitle", ""),
-            "to": r.get("ToTitle", ""),
-            "from_address": r.get("FromAddress", ""),
-            "to_address": r.get("ToAddress", ""),
-            "from_lat": r.get("FromLat"),
-            "from_lng": r.get("FromLng"),
-            "to_lat": r.get("ToLat"),
-            "to_lng": r.get("ToLng"),
-            "prices": prices_by_route.get(r.get("RouteID"), []),
-            "key": _route_key(r.get("FromTitle",""), r.get("ToTitle","")),
-            "title": r.get("Title", ""),
-        })
-
+        built_routes.append(Route(
+            route_id=_intern(r.get("RouteID","")),
+            **{"from": _intern(r.get("FromTitle", "")), "to": _intern(r.get("ToTitle", ""))},
+            from_address=_intern(r.get("FromAddress", "")),
+            to_address=_intern(r.get("ToAddress", "")),
+            from_lat=_num(r.get("FromLat")),
+            from_lng=_num(r.get("FromLng")),
+            to_lat=_num(r.get("ToLat")),
+            to_lng=_num(r.get("ToLng")),
+            prices=tuple(prices_by_route.get(r.get("RouteID"), ())),
+            key=_intern(_route_key(r.get("FromTitle",""), r.get("ToTitle",""))),
+            title=_intern(r.get("Title", "")),
+            duration_min=_num(r.get("DurationMin")),
+            distance_km=_num(r.get("DistanceKm")),
+        ))
+
+    _ROUTE_KEYS[_spreadsheet_id()] = {r["key"] for r in built_routes}
+    _ROW_INDEX[_spreadsheet_id()] = _build_row_index(places, routes)
     return {"places": places, "routes": built_routes}
 
+# --------- Diagnostik (endast läsning) ----------
+def diagnostic_probes(full=True):
+    """
+    En probe per läsväg som modulen använder (se diagnostics.py):
+    metadata (worksheet-uppslag), hela bladen via get_all_records,
+    rubrikraden och batch-läsningen av rutt-nycklar.
+    full=False: bara rubrikraden och rutt-nycklarna (billigt nog för webben –
+    hela bladen äter Sheets läskvot per minut).
+    Kalkylarket öppnas här (auth räknas inte in i mätningen).
+    """
+    sh = _open_sheet()
+    places = _ws(sh, os.getenv("SHEETS_PLACES", "Places"))
+    routes = _ws(sh, os.getenv("SHEETS_ROUTES", "Routes"))
+    prices = _ws(sh, os.getenv("SHEETS_PRICES", "RoutePrices"))
+    header = routes.row_values(1) if routes else []
+
+    probes = []
+    if full:
+        probes.append(("sheets.metadata", lambda: sh.fetch_sheet_metadata() and "OK"))
+        for name, ws in (("sheets.places", places), ("sheets.routes", routes), ("sheets.route_prices", prices)):
+            if ws is None:
+                probes.append((name, lambda: "WORKSHEET_MISSING"))
+            else:
+                probes.append((name, lambda ws=ws: _get_all(ws) is not None and "OK"))
+    elif routes is None:
+        probes.append(("sheets.routes", lambda: "WORKSHEET_MISSING"))
+    if routes is not None:
+        probes.append(("sheets.routes_header", lambda: routes.row_values(1) and "OK"))
+        if all(n in header for n in ("RouteID", "FromTitle", "ToTitle")):
+            probes.append(("sheets.route_keys", lambda: _scan_route_keys(routes, header) is not None and "OK"))
+    return probes
+
+
 # --------- Skrivning / dubblettkontroll ----------
+# Unik-nyckelindex över Routes (_route_key) per kalkylark. Byggs av load_all()
+# och hålls uppdaterat vid skrivning, så dubblettkontrollen är en set-uppslagning.
+_ROUTE_KEYS = {}
+# Check + append + verifiering körs under lås så att två admins i samma process
+# inte kan skapa samma rutt; mellan processer fångas det av _verify_route_claims().
+_ROUTE_WRITE_LOCK = threading.Lock()
+
+def _col_letter(col: int) -> str:
+    letters = ""
+    while col > 0:
+        col, rem = divmod(col - 1, 26)
+        letters = chr(65 + rem) + letters
+    return letters
+
+def _a1(row: int, col: int) -> str:
+    """Som gspread.utils.rowcol_to_a1, utan att importera gspread."""
+    return f"{_col_letter(col)}{row}"
+
+def _scan_route_keys(ws, header=None, first=2, last=None):
+    """
+    Läs bara RouteID/FromTitle/ToTitle (ETT batch-anrop, inte hela bladet),
+    för raderna first..last (last=None → till slutet).
+    Returnerar [(radnummer, _route_key, route_id)].
+    """
+    header = header or ws.row_values(1)
+    names = ["RouteID", "FromTitle", "ToTitle"]
+    ranges = []
+    for name in names:
+        letter = _col_letter(header.index(name) + 1)
+        ranges.append(f"{letter}{first}:{letter}{last or ''}")
+    cols = [[(cell[0] if cell else "") for cell in col] for col in ws.batch_get(ranges)]
+    n = max((len(c) for c in cols), default=0)
+    rid, f, t = (c + [""] * (n - len(c)) for c in cols)
+    return [
+        (first + i, _route_key(f[i], t[i]), rid[i])
+        for i in range(n)
+        if f[i] or t[i]
+    ]
+
 def list_route_keys():
-    sh = _open_sheet()
-    ws = _ws(sh, os.getenv("SHEETS_ROUTES", "Routes"))
-    keys = set()
-    if not ws:
-        return keys
-    for r in ws.get_all_records():
-        keys.add(_route_key(r.get("FromTitle",""), r.get("ToTitle","")))
+    """Mängden _route_key i Routes – från indexet, annars läses bara titelkolumnerna en gång."""
+    spreadsheet_id = _spreadsheet_id()
+    keys = _ROUTE_KEYS.get(spreadsheet_id)
+    if keys is None:
+        ws = _ws(_open_sheet(), os.getenv("SHEETS_ROUTES", "Routes"))
+        scanned = _scan_route_keys(ws) if ws else []
+        keys = {k for _, k, _ in scanned}
+        _ROUTE_KEYS[spreadsheet_id] = keys
+        if scanned:
+            _row_index()["routes_last_row"] = scanned[-1][0]
     return keys
 
+def _verify_route_claims(ws, header, claimed: dict, appended_rows):
+    """
+    Efter append: om en nyckel nu finns flera gånger vinner den första raden.
+    Läser bara raderna som tillkommit sedan snapshoten (andra processers append)
+    t.o.m. våra egna (appended_rows, ur append-svaret) – inte hela bladet.
+    Våra förlorande rader tas bort, var och en först efter att raden lästs om och
+    RouteID stämmer. claimed = {key: route_id}. Returnerar förlorade nycklar.
+    Vinnande rader förs in i radindexet (RouteID → rad).
+    """
+    idx = _row_index()
+    if not appended_rows:
+        return set()
+    known = idx["routes_last_row"]
+    first_row = min(known + 1, appended_rows[0]) if known else appended_rows[0]
+    first, lost_ids, lost, ours = {}, {}, set(), {}
+    our_ids = set(claimed.values())
+    for row, key, rid in _scan_route_keys(ws, header, first_row, appended_rows[-1]):
+        if rid not in our_ids and (not known or row > known):
+            # Någon annans nya rutt – räkna platsreferenserna så delete_place ser den
+            _add_route_refs(*key.split("→"))
+        if key not in claimed:
+            continue
+        first.setdefault(key, rid)
+        if rid == claimed[key]:
+            if first[key] != rid:
+                lost_ids[rid] = row
+                lost.add(key)
+            else:
+                ours[rid] = row
+    idx["routes_last_row"] = max(known or 0, appended_rows[-1])
+
+    deleted = []
+    for rid, row in sorted(lost_ids.items(), key=lambda kv: kv[1], reverse=True):
+        # Raden kan ha flyttats om någon annan raderat en rutt under tiden
+        row, _, header = _find_row(ws, {rid: row}, header, "RouteID", rid)
+        if row is None:
+            continue
+        ws.delete_rows(row)
+        deleted.append(row)
+        _rows_deleted(ours, [row])
+    if deleted:
+        _rows_deleted(idx["route_row_by_id"], deleted)
+        idx["routes_last_row"] -= len(deleted)
+    idx["route_row_by_id"].update(ours)
+    return lost
+
+def parse_price_band(label, min_v, max_v="", total="", ppp=""):
+    """
+    Validera en priskategori (samma regler som formuläret i Inställningar):
+    Min krävs och exakt en av Total / Pris/Person. Returnerar pris-dict, annars ValueError.
+    """
+    label = str(label or "").strip()
+    min_v, max_v = str(min_v or "").strip(), str(max_v or "").strip()
+    total, ppp = str(total or "").strip(), str(ppp or "").strip()
+    if not min_v:
+        raise ValueError(f"Pris '{label}' måste ha Min.")
+    if (total == "" and ppp == "") or (total != "" and ppp != ""):
+        raise ValueError(f"Pris '{label}' måste ha antingen Total eller Pris/Person.")
+    try:
+        price = {"label": label, "min": int(min_v)}
+        if max_v != "":
+            price["max"] = int(max_v)
+        if total != "":
+            price["total"] = int(total)
+        if ppp != "":
+            price["price_per_person"] = int(ppp)
+    except ValueError:
+        raise ValueError(f"Pris '{label}' har ett ogiltigt tal.")
+    return price
+
+def _price_row(route_id, p):
+    label = p.get("label","")
+    min_v = int(p.get("min",0))
+    max_v = p.get("max")
+    max_v = (int(max_v) if max_v not in (None,"") else "")
+    total = p.get("total")
+    ppp   = p.get("price_per_person")
+    if (total is None and ppp is None) or (total not in (None,"") and ppp not in (None,"")):
+        raise ValueError(f"Prisraden '{label}' måste ha antingen Total ELLER Pris/Person (inte båda).")
+    return [str(uuid.uuid4()), route_id, label, min_v, max_v if max_v != "" else "",
+            (int(total) if total not in (None,"") else ""),
+            (int(ppp) if ppp not in (None,"") else "")]
+
+def _route_row(header, route_id, group_id, key, r):
+    """
+    En Routes-rad: de 12 ursprungliga kolumnerna positionellt (som alltid),
+    DurationMin/DistanceKm på sina platser enligt rubrikraden.
+    """
+    row = [route_id, r.get("from_title"), r.get("to_title"), r.get("from_address"), r.get("to_address"),
+           r.get("title", ""), group_id, r.get("from_lat"), r.get("from_lng"),
+           r.get("to_lat"), r.get("to_lng"), key]
+    row = ["" if v is None else v for v in row]
+    for name, field in zip(ROUTE_TRAVEL_COLUMNS, ("duration_min", "distance_km")):
+        c = header.index(name)
+        if c < ROUTE_BASE_COLUMNS:
+            raise RuntimeError(f"Routes: kolumnen {name} ligger bland de {ROUTE_BASE_COLUMNS} första.")
+        row += [""] * (c + 1 - len(row))
+        if r.get(field) is not None:
+            row[c] = r[field]
+    return row
+
 def append_place(title: str, address: str, lat: float=None, lng: float=None, aliases: str=""):
     sh = _open_sheet()
     ws = _ws(sh, os.getenv("SHEETS_PLACES","Places"))
     if not ws:
         raise RuntimeError("Worksheet 'Places' saknas.")
     place_id = str(uuid.uuid4())
-    ws.append_row(
+    resp = ws.append_row(
         [place_id, title, address, lat if lat is not None else "", lng if lng is not None else "", aliases],
         value_input_option="RAW"
     )
+    idx = _row_index()
+    for row in _appended_rows(resp):
+        idx["place_row_by_id"][place_id] = row
+        idx["place_row_by_title"].setdefault(title, row)
     return place_id
 
+def append_places_bulk(places: list):
+    """Lägg till många platser med ETT append-anrop. places = [{title, address, lat, lng, aliases}]."""
+    if not places:
+        return []
+    sh = _open_sheet()
+    ws = _ws(sh, os.getenv("SHEETS_PLACES","Places"))
+    if not ws:
+        raise RuntimeError("Worksheet 'Places' saknas.")
+    ids, rows = [], []
+    for p in places:
+        place_id = str(uuid.uuid4())
+        ids.append(place_id)
+        rows.append([place_id, p["title"], p.get("address", ""),
+                     p["lat"] if p.get("lat") is not None else "",
+                     p["lng"] if p.get("lng") is not None else "",
+                     p.get("aliases", "")])
+    resp = ws.append_rows(rows, value_input_option="RAW")
+    idx = _row_index()
+    for row, place_id, p in zip(_appended_rows(resp), ids, places):
+        idx["place_row_by_id"][place_id] = row
+        idx["place_row_by_title"].setdefault(p["title"], row)
+    return ids
+
 def append_route_with_prices(
     from_title: str, to_title: str,
     from_address: str, to_address: str,
@@ -123,6 +597,7 @@ def append_route_with_prices(
     from_lat: float=None, from_lng: float=None,
     to_lat: float=None, to_lng: float=None,
     prices: list = None,
+    duration_min: float=None, distance_km: float=None,
 ):
     prices = prices or []
     sh = _open_sheet()
@@ -132,37 +607,83 @@ def append_route_with_prices(
         raise RuntimeError("Worksheet 'Routes' eller 'RoutePrices' saknas.")
 
     key = _route_key(from_title, to_title)
-    if key in list_route_keys():
-        raise ValueError("Denna rutt finns redan i Sheets (dubblett).")
-
     route_id = str(uuid.uuid4())
     group_id = group_id or str(uuid.uuid4())
-    ws_routes.append_row(
-        [route_id, from_title, to_title, from_address, to_address, title, group_id,
-         from_lat if from_lat is not None else "", from_lng if from_lng is not None else "",
-         to_lat if to_lat is not None else "", to_lng if to_lng is not None else "", key],
-        value_input_option="RAW"
-    )
-
-    for p in prices:
-        label = p.get("label","")
-        min_v = int(p.get("min",0))
-        max_v = p.get("max")
-        max_v = (int(max_v) if max_v not in (None,"") else "")
-        total = p.get("total")
-        ppp   = p.get("price_per_person")
-        if (total is None and ppp is None) or (total not in (None,"") and ppp not in (None,"")):
-            raise ValueError(f"Prisraden '{label}' måste ha antingen Total ELLER Pris/Person (inte båda).")
-        price_id = str(uuid.uuid4())
-        ws_prices.append_row(
-            [price_id, route_id, label, min_v, max_v if max_v != "" else "",
-             (int(total) if total not in (None,"") else ""),
-             (int(ppp) if ppp not in (None,"") else "")],
-            value_input_option="RAW"
-        )
+    # Validera alla prisrader innan något skrivs
+    price_rows = [_price_row(route_id, p) for p in prices]
+    route = {
+        "from_title": from_title, "to_title": to_title,
+        "from_address": from_address, "to_address": to_address, "title": title,
+        "from_lat": from_lat, "from_lng": from_lng, "to_lat": to_lat, "to_lng": to_lng,
+        "duration_min": duration_min, "distance_km": distance_km,
+    }
+
+    with _ROUTE_WRITE_LOCK:
+        keys = list_route_keys()
+        if key in keys:
+            raise ValueError("Denna rutt finns redan i Sheets (dubblett).")
+
+        header = _ensure_columns(ws_routes, ROUTE_TRAVEL_COLUMNS)
+        resp = ws_routes.append_row(_route_row(header, route_id, group_id, key, route), value_input_option="RAW")
+        if _verify_route_claims(ws_routes, header, {key: route_id}, _appended_rows(resp)):
+            keys.add(key)
+            raise ValueError("Denna rutt finns redan i Sheets (dubblett).")
+        keys.add(key)
+        _add_route_refs(from_title, to_title)
+
+    if price_rows:
+        ws_prices.append_rows(price_rows, value_input_option="RAW")
 
     return {"route_id": route_id, "group_id": group_id}
 
+def append_routes_bulk(routes: list):
+    """
+    Lägg till många rutter + prisrader med två append-anrop totalt.
+    routes = [{from_title, to_title, from_address, to_address, title, group_id,
+               from_lat, from_lng, to_lat, to_lng, duration_min, distance_km, prices}]
+    Dubbletter (mot Sheets och inom batchen) hoppas över.
+    Returnerar {"added": [route_id, ...], "duplicates": [key, ...]}.
+    """
+    added, duplicates = [], []
+    if not routes:
+        return {"added": added, "duplicates": duplicates}
+    sh = _open_sheet()
+    ws_routes = _ws(sh, os.getenv("SHEETS_ROUTES","Routes"))
+    ws_prices = _ws(sh, os.getenv("SHEETS_PRICES","RoutePrices"))
+    if not ws_routes or not ws_prices:
+        raise RuntimeError("Worksheet 'Routes' eller 'RoutePrices' saknas.")
+
+    with _ROUTE_WRITE_LOCK:
+        keys = list_route_keys()
+        header = _ensure_columns(ws_routes, ROUTE_TRAVEL_COLUMNS)
+        claimed, route_rows, prices_by_key, lost = {}, [], {}, set()
+        for r in routes:
+            key = _route_key(r["from_title"], r["to_title"])
+            if key in keys or key in claimed:
+                duplicates.append(key)
+                continue
+            route_id = str(uuid.uuid4())
+            claimed[key] = route_id
+            prices_by_key[key] = [_price_row(route_id, p) for p in r.get("prices") or []]
+            route_rows.append(_route_row(header, route_id, r.get("group_id") or str(uuid.uuid4()), key, r))
+
+        if route_rows:
+            resp = ws_routes.append_rows(route_rows, value_input_option="RAW")
+            lost = _verify_route_claims(ws_routes, header, claimed, _appended_rows(resp))
+            duplicates.extend(lost)
+            keys.update(claimed)
+
+    price_rows = []
+    for r in routes:
+        key = _route_key(r["from_title"], r["to_title"])
+        if key in claimed and key not in lost and claimed[key] not in added:
+            added.append(claimed[key])
+            price_rows.extend(prices_by_key[key])
+            _add_route_refs(r["from_title"], r["to_title"])
+    if price_rows:
+        ws_prices.append_rows(price_rows, value_input_option="RAW")
+    return {"added": added, "duplicates": duplicates}
+
 def delete_route(route_id: str):
     """Tar bort en route + alla dess prisrader."""
     sh = _open_sheet()
@@ -174,12 +695,28 @@ def delete_route(route_id: str):
     # Routes
     r_values = ws_routes.get_all_values()
     r_header = r_values[0]; rid_col = r_header.index("RouteID")+1
-    r_del = []
+    f_col = r_header.index("FromTitle")+1; t_col = r_header.index("ToTitle")+1
+    r_del, r_keys = [], set()
     for i, row in enumerate(r_values[1:], start=2):
         if len(row) >= rid_col and row[rid_col-1] == route_id:
             r_del.append(i)
-    for idx in reversed(r_del):
-        ws_routes.delete_rows(idx)
+            r_keys.add(_route_key(row[f_col-1] if len(row) >= f_col else "",
+                                  row[t_col-1] if len(row) >= t_col else ""))
+    with _ROUTE_WRITE_LOCK:
+        for idx in reversed(r_del):
+            ws_routes.delete_rows(idx)
+        list_route_keys().difference_update(r_keys)
+    index = _row_index()
+    _rows_deleted(index["route_row_by_id"], r_del)
+    if index["routes_last_row"]:
+        index["routes_last_row"] -= len(r_del)
+    if index["place_refs"] is not None:
+        for i in r_del:
+            row = r_values[i-1]
+            for t in {_norm(row[f_col-1]) if len(row) >= f_col else "",
+                      _norm(row[t_col-1]) if len(row) >= t_col else ""}:
+                if t and index["place_refs"].get(t):
+                    index["place_refs"][t] -= 1
 
     # RoutePrices
     p_values = ws_prices.get_all_values()
@@ -201,51 +738,53 @@ def delete_place(place_id: str):
     if not ws_places or not ws_routes:
         raise RuntimeError("Worksheet saknas.")
 
-    p_values = ws_places.get_all_values()
-    p_header = p_values[0]
-    pid_col = p_header.index("PlaceID")+1
-    title_col = p_header.index("Title")+1
-    row_idx, title = None, None
-    for i, row in enumerate(p_values[1:], start=2):
-        if len(row) >= pid_col and row[pid_col-1] == place_id:
-            row_idx = i
-            title = row[title_col-1] if len(row) >= title_col else None
-            break
+    index = _row_index()
+    row_idx, row, p_header = _find_row(
+        ws_places, index["place_row_by_id"], index["places_header"], "PlaceID", place_id
+    )
     if row_idx is None:
         raise ValueError("PlaceID hittades inte.")
+    title_col = p_header.index("Title")+1
+    title = row[title_col-1] if len(row) >= title_col else None
 
-    # finns rutter som använder denna Title?
+    # finns rutter som använder denna Title? Referensräknaren (snapshot + våra och
+    # verifierade append) räcker för att säga ja. Ett nej bekräftas bara mot raderna
+    # efter routes_last_row (andra workers append sedan dess) – utan index hela bladet.
     if title:
-        r_values = ws_routes.get_all_values()
-        r_header = r_values[0]
-        f_col = r_header.index("FromTitle")+1
-        t_col = r_header.index("ToTitle")+1
-        for row in r_values[1:]:
-            if len(row) >= max(f_col, t_col) and (row[f_col-1] == title or row[t_col-1] == title):
-                raise ValueError(f"Platsen '{title}' används av en rutt. Ta bort rutter först.")
+        norm = _norm(title)
+        refs, last = index["place_refs"], index["routes_last_row"]
+        in_use = bool(refs and refs.get(norm, 0) > 0)
+        if not in_use:
+            first = last + 1 if refs is not None and last else 2
+            scanned = _scan_route_keys(ws_routes, index["routes_header"], first=first)
+            in_use = any(norm in key.split("→") for _, key, _ in scanned)
+        if in_use:
+            raise ValueError(f"Platsen '{title}' används av en rutt. Ta bort rutter först.")
 
     ws_places.delete_rows(row_idx)
+    _rows_deleted(index["place_row_by_id"], [row_idx])
+    _rows_deleted(index["place_row_by_title"], [row_idx])
     return True
+
 def update_route_row(route_id: str, from_addr=None, to_addr=None,
-                     from_lat=None, from_lng=None, to_lat=None, to_lng=None):
-    """Uppdatera en redan skapad rutt med lat/lng och/eller adresser."""
+                     from_lat=None, from_lng=None, to_lat=None, to_lng=None,
+                     duration_min=None, distance_km=None):
+    """Uppdatera en redan skapad rutt med lat/lng, adresser och/eller restid/avstånd."""
     sh = _open_sheet()
     ws = _ws(sh, os.getenv("SHEETS_ROUTES", "Routes"))
     if not ws:
         raise RuntimeError("Worksheet 'Routes' saknas.")
 
-    values = ws.get_all_values()
-    header = values[0]
-    col = {name: header.index(name) + 1 for name in
-           ["RouteID", "FromAddress", "ToAddress", "FromLat", "FromLng", "ToLat", "ToLng"]}
-
-    row_idx = None
-    for i, row in enumerate(values[1:], start=2):
-        if len(row) >= col["RouteID"] and row[col["RouteID"]-1] == route_id:
-            row_idx = i
-            break
+    index = _row_index()
+    header = index["routes_header"]
+    if duration_min is not None or distance_km is not None:
+        header = _ensure_columns(ws, ROUTE_TRAVEL_COLUMNS)
+    row_idx, _, header = _find_row(ws, index["route_row_by_id"], header, "RouteID", route_id)
     if row_idx is None:
         raise ValueError("RouteID hittades inte.")
+    col = {name: header.index(name) + 1 for name in
+           ["RouteID", "FromAddress", "ToAddress", "FromLat", "FromLng", "ToLat", "ToLng"]
+           + [c for c in ROUTE_TRAVEL_COLUMNS if c in header]}
 
     updates = []
     if from_addr is not None: updates.append(("FromAddress", from_addr))
@@ -254,12 +793,48 @@ def update_route_row(route_id: str, from_addr=None, to_addr=None,
     if from_lng  is not None: updates.append(("FromLng",     from_lng))
     if to_lat    is not None: updates.append(("ToLat",       to_lat))
     if to_lng    is not None: updates.append(("ToLng",       to_lng))
+    if duration_min is not None: updates.append(("DurationMin", duration_min))
+    if distance_km  is not None: updates.append(("DistanceKm",  distance_km))
 
-    for key, val in updates:
-        ws.update_cell(row_idx, col[key], val)
+    if updates:
+        ws.batch_update(
+            [{"range": _a1(row_idx, col[key]), "values": [[val]]} for key, val in updates],
+            value_input_option="RAW",
+        )
     return True
 
 
+def update_routes_travel_details(travel: dict):
+    """
+    Skriv restid/avstånd för många rutter på en gång.
+    travel = {route_id: (duration_min, distance_km)}. Returnerar antal uppdaterade rader.
+    """
+    if not travel:
+        return 0
+    sh = _open_sheet()
+    ws = _ws(sh, os.getenv("SHEETS_ROUTES", "Routes"))
+    if not ws:
+        raise RuntimeError("Worksheet 'Routes' saknas.")
+
+    _ensure_columns(ws, ROUTE_TRAVEL_COLUMNS)
+    values = ws.get_all_values()
+    header = values[0]
+    c_rid = header.index("RouteID") + 1
+    c_dur = header.index("DurationMin") + 1
+    c_dist = header.index("DistanceKm") + 1
+
+    data = []
+    for i, row in enumerate(values[1:], start=2):
+        rid = row[c_rid-1] if len(row) >= c_rid else ""
+        if rid in travel:
+            dur, dist = travel[rid]
+            data.append({"range": _a1(i, c_dur), "values": [[dur]]})
+            data.append({"range": _a1(i, c_dist), "values": [[dist]]})
+    if data:
+        ws.batch_update(data, value_input_option="RAW")
+    return len(data) // 2
+
+
 def update_place_latlng_by_title(title: str, lat: float, lng: float):
     """Skriv lat/lng till Places för en given Title om den finns."""
     sh = _open_sheet()
@@ -267,15 +842,81 @@ def update_place_latlng_by_title(title: str, lat: float, lng: float):
     if not ws:
         raise RuntimeError("Worksheet 'Places' saknas.")
 
-    values = ws.get_all_values()
-    header = values[0]
-    c_title = header.index("Title") + 1
-    c_lat   = header.index("Lat") + 1
-    c_lng   = header.index("Lng") + 1
+    index = _row_index()
+    row_idx, _, header = _find_row(ws, index["place_row_by_title"], index["places_header"], "Title", title)
+    if row_idx is None:
+        return False
+    c_lat = header.index("Lat") + 1
+    c_lng = header.index("Lng") + 1
+    ws.batch_update(
+        [
+            {"range": _a1(row_idx, c_lat), "values": [[lat]]},
+            {"range": _a1(row_idx, c_lng), "values": [[lng]]},
+        ],
+        value_input_option="RAW",
+    )
+    return True
 
-    for i, row in enumerate(values[1:], start=2):
-        if len(row) >= c_title and row[c_title-1] == title:
-            ws.update_cell(i, c_lat, lat)
-            ws.update_cell(i, c_lng, lng)
-            return True
-    return False
+
+def _cell(row, col):
+    return row[col-1] if len(row) >= col else ""
+
+def fill_missing_coordinates(places: dict, routes: dict):
+    """
+    Skriv saknade koordinater i bulk – ETT batch_update per blad.
+    places = {Title: (lat, lng)}, routes = {RouteID: {"from": (lat, lng), "to": (lat, lng)}}.
+    Bladen läses om och bara celler som fortfarande är tomma skrivs, så en koordinat
+    som någon hunnit fylla i under tiden skrivs aldrig över.
+    Returnerar (antal platsrader, antal ruttändar) som fick koordinater.
+    """
+    sh = _open_sheet()
+    n_places = n_ends = 0
+
+    if places:
+        ws = _ws(sh, os.getenv("SHEETS_PLACES", "Places"))
+        if not ws:
+            raise RuntimeError("Worksheet 'Places' saknas.")
+        values = ws.get_all_values()
+        header = values[0]
+        c_title = header.index("Title") + 1
+        c_lat = header.index("Lat") + 1
+        c_lng = header.index("Lng") + 1
+        data = []
+        for i, row in enumerate(values[1:], start=2):
+            title = _cell(row, c_title)
+            if title not in places or (_num(_cell(row, c_lat)) is not None and _num(_cell(row, c_lng)) is not None):
+                continue
+            lat, lng = places[title]
+            data.append({"range": _a1(i, c_lat), "values": [[lat]]})
+            data.append({"range": _a1(i, c_lng), "values": [[lng]]})
+            n_places += 1
+        if data:
+            ws.batch_update(data, value_input_option="RAW")
+
+    if routes:
+        ws = _ws(sh, os.getenv("SHEETS_ROUTES", "Routes"))
+        if not ws:
+            raise RuntimeError("Worksheet 'Routes' saknas.")
+        values = ws.get_all_values()
+        header = values[0]
+        c_rid = header.index("RouteID") + 1
+        cols = {
+            "from": (header.index("FromLat") + 1, header.index("FromLng") + 1),
+            "to": (header.index("ToLat") + 1, header.index("ToLng") + 1),
+        }
+        data = []
+        for i, row in enumerate(values[1:], start=2):
+            ends = routes.get(_cell(row, c_rid))
+            if not ends:
+                continue
+            for end, (lat, lng) in ends.items():
+                c_lat, c_lng = cols[end]
+                if _num(_cell(row, c_lat)) is not None and _num(_cell(row, c_lng)) is not None:
+                    continue
+                data.append({"range": _a1(i, c_lat), "values": [[lat]]})
+                data.append({"range": _a1(i, c_lng), "values": [[lng]]})
+                n_ends += 1
+        if data:
+            ws.batch_update(data, value_input_option="RAW")
+
+    return n_places, n_ends
@@ -0,0 +1,205 @@
+"""
+Flera taxibolag (tenants) i samma process.
+
+Konfiguration: env TENANTS (JSON) eller filen TENANTS_FILE (default tenants.json):
+    {"bolag-a": {"spreadsheet_id": "...", "hosts": ["a.example.se"],
+                 "settings_file": "settings-bolag-a.json"}}
+Utan konfiguration finns bara DEFAULT (GOOGLE_SHEETS_SPREADSHEET_ID + settings.json),
+dvs. samma beteende som före tenants.
+
+Tenant väljs av värdnamnet (hosts); X-Tenant/?tenant= kräver admin-token.
+Aktuell tenant är en contextvar (sätts per request i app.py), så all kod under
+en request – sheets_repo, cachar, tariffer – ser samma bolag.
+TenantLRU håller per-tenant-tillstånd inom en minnesbudget och släpper bolag
+som inte använts på ett tag; de laddas om vid nästa anrop.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+DEFAULT = "default"
+_CURRENT = contextvars.ContextVar("tenant", default=DEFAULT)
+_CONFIG = {"tenants": None}
+
+
+def _load_config():
+    raw = os.getenv("TENANTS")
+    if not raw:
+        path = os.getenv("TENANTS_FILE", "tenants.json")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                raw = f.read()
+    tenants = {}
+    if raw:
+        try:
+            tenants = {str(k): dict(v or {}) for k, v in json.loads(raw).items()}
+        except (ValueError, AttributeError) as e:
+            print("⚠️ Ogiltig tenant-konfiguration:", e)
+    tenants.setdefault(DEFAULT, {})
+    return tenants
+
+
+def all_tenants():
+    """{tenant_id: config} – läses en gång per process."""
+    tenants = _CONFIG["tenants"]
+    if tenants is None:
+        tenants = _CONFIG["tenants"] = _load_config()
+    return tenants
+
+
+def exists(tenant_id):
+    return tenant_id in all_tenants()
+
+
+def current():
+    return _CURRENT.get()
+
+
+def config(tenant_id=None):
+    return all_tenants().get(tenant_id or current(), {})
+
+
+def activate(tenant_id):
+    """Sätt aktuell tenant; returnerar token för deactivate()."""
+    return _CURRENT.set(tenant_id)
+
+
+def deactivate(token):
+    _CURRENT.reset(token)
+
+
+@contextmanager
+def use(tenant_id):
+    token = activate(tenant_id)
+    try:
+        yield
+    finally:
+        deactivate(token)
+
+
+def spreadsheet_id():
+    """Aktuell tenants kalkylark (DEFAULT: GOOGLE_SHEETS_SPREADSHEET_ID)."""
+    return config().get("spreadsheet_id") or os.getenv("GOOGLE_SHEETS_SPREADSHEET_ID")
+
+
+def per_tenant_path(path, tenant_id=None):
+    """'quote_matrix.bin' → 'quote_matrix-bolag-a.bin' för andra tenants än DEFAULT."""
+    tenant_id = tenant_id or current()
+    if tenant_id == DEFAULT:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-{tenant_id}{ext}"
+
+
+def resolve(host="", header="", query="", allow_override=False):
+    """
+    Tenant för en request: värdnamnet. X-Tenant-header/?tenant= gäller bara om
+    allow_override (admin) – annars kunde vem som helst läsa/ändra ett annat bolags data.
+    Returnerar (tenant_id, källa) eller (None, källa) om en angiven tenant saknas
+    eller inte får väljas.
+    """
+    for value, source in ((header, "header"), (query, "query")):
+        if value:
+            if not allow_override:
+                return None, source
+            return (value, source) if exists(value) else (None, source)
+    host = (host or "").split(":")[0].lower()
+    for tenant_id, cfg in all_tenants().items():
+        if host and host in [h.lower() for h in cfg.get("hosts", [])]:
+            return tenant_id, "host"
+    return DEFAULT, "default"
+
+
+class TenantLRU:
+    """
+    Tillstånd per tenant (skapas med factory(tenant_id)) i LRU-ordning.
+    - max_bytes: budget för summan av state.size_bytes(); äldst använda släpps först
+    - idle_s: tenants som inte använts så länge släpps
+    DEFAULT och den tenant som efterfrågas släpps aldrig i samma svep.
+    on_evict(tenant_id, state) anropas för att städa externa cachar.
+    """
+
+    def __init__(self, factory, max_bytes, idle_s, on_evict=None, sweep_s=30.0):
+        self.factory = factory
+        self.max_bytes = int(max_bytes)
+        self.idle_s = float(idle_s)
+        self.on_evict = on_evict
+        self.sweep_s = float(sweep_s)
+        self._items = OrderedDict()  # tenant_id → [state, senast_använd]
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, tenant_id):
+        return tenant_id in self._items
+
+    def get(self, tenant_id):
+        now = time.monotonic()
+        created = False
+        with self._lock:
+            item = self._items.get(tenant_id)
+            if item is None:
+                item = self._items[tenant_id] = [self.factory(tenant_id), now]
+                created = True
+            else:
+                item[1] = now
+                self._items.move_to_end(tenant_id)
+            evicted = []
+            if created or now - self._last_sweep >= self.sweep_s:
+                self._last_sweep = now
+                evicted = self._sweep(now, keep=tenant_id)
+        for tid, state in evicted:
+            self._evicted(tid, state)
+        return item[0]
+
+    def discard(self, tenant_id):
+        """Släpp en tenant direkt (on_evict anropas). Sant om den fanns."""
+        with self._lock:
+            item = self._items.pop(tenant_id, None)
+        if item is not None:
+            self._evicted(tenant_id, item[0])
+        return item is not None
+
+    def sweep(self):
+        """Släpp tenants som varit inaktiva/tar för mycket minne (t.ex. från ett bakgrundsjobb)."""
+        with self._lock:
+            self._last_sweep = time.monotonic()
+            evicted = self._sweep(self._last_sweep, keep=None)
+        for tid, state in evicted:
+            self._evicted(tid, state)
+        return [tid for tid, _ in evicted]
+
+    def _sweep(self, now, keep):
+        evicted = []
+        for tid, (state, used) in list(self._items.items()):
+            if tid not in (keep, DEFAULT) and now - used > self.idle_s:
+                evicted.append((tid, self._items.pop(tid)[0]))
+        sizes = {tid: item[0].size_bytes() for tid, item in self._items.items()}
+        total = sum(sizes.values())
+        for tid in list(self._items):  # äldst använda först
+            if total <= self.max_bytes:
+                break
+            if tid in (keep, DEFAULT):
+                continue
+            total -= sizes[tid]
+            evicted.append((tid, self._items.pop(tid)[0]))
+        return evicted
+
+    def _evicted(self, tenant_id, state):
+        print(f"♻️ Tenant {tenant_id} släppt ur minnet.")
+        if self.on_evict:
+            try:
+                self.on_evict(tenant_id, state)
+            except Exception as e:
+                print("⚠️ Tenant-städning fel:", e)
+
+    def usage(self):
+        """{tenant_id: uppskattade bytes} i LRU-ordning."""
+        with self._lock:
+            return {tid: item[0].size_bytes() for tid, item in self._items.items()}
@@ -0,0 +1,53 @@
+import os
+import unittest
+from unittest import mock
+
+os.environ.setdefault("QUOTE_JOURNAL_DIR", "")  # ingen journal på disk från testerna
+
+import app
+import sheets_repo
+
+
+def _route(title=""):
+    return sheets_repo.Route(
+        route_id="r1", **{"from": "Östersund Flygplats", "to": "Åre"}, title=title,
+        prices=(sheets_repo.PriceBand("1-4", 1, 4, total=1500),),
+        duration_min=60, distance_km=100,
+    )
+
+
+class ReversedRouteQuoteTest(unittest.TestCase):
+    def _quote(self, route, origin, destination):
+        with mock.patch.object(app, "find_fixed_route", return_value=route), \
+             mock.patch.object(app, "fixed_route_endpoints", return_value=("63.2,14.5", "63.4,13.1")):
+            result, _, journal = app.compute_quote(origin, destination, 3, is_fixed=True)
+        return result, journal
+
+    def test_reversed_route_label_follows_travel_direction(self):
+        route = _route(title="Östersund Flygplats → Åre").reversed()
+        result, journal = self._quote(route, "Åre", "Östersund Flygplats")
+        self.assertEqual(result["fixed_route"], "Åre → Östersund Flygplats")
+        self.assertEqual(journal["route"], "Åre → Östersund Flygplats")
+        self.assertEqual(result["origin"], "Åre")
+
+    def test_forward_route_keeps_stored_title(self):
+        result, _ = self._quote(_route(title="Flygtaxi Åre"), "Östersund Flygplats", "Åre")
+        self.assertEqual(result["fixed_route"], "Flygtaxi Åre")
+
+
+class OptimalFleetTest(unittest.TestCase):
+    def test_cheapest_mix(self):
+        self.assertEqual(app.optimal_fleet(4, ((8, 120, None), (4, 100, None))), (0, 1))
+        self.assertEqual(app.optimal_fleet(13, ((8, 120, None), (4, 100, None))), (2, 0))
+
+    def test_equal_price_prefers_large_cars(self):
+        vehicles = ((8, 100, None), (4, 100, None))
+        self.assertEqual(app.optimal_fleet(4, vehicles), (1, 0))
+        self.assertEqual(app.optimal_fleet(12, vehicles), (2, 0))
+
+    def test_not_enough_vehicles(self):
+        self.assertIsNone(app.optimal_fleet(20, ((8, 100, 1), (4, 100, 2))))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+from unittest import mock
+
+from gspread.http_client import HTTPClient
+
+import sheets_repo
+
+
+class _FakeSession:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class AfterForkTest(unittest.TestCase):
+    def test_closes_inherited_session(self):
+        client = HTTPClient.__new__(HTTPClient)  # utan auth – bara sessionen behövs
+        client.session = _FakeSession()
+        sh = mock.Mock(spec=["client"], client=client)
+        with mock.patch.dict(sheets_repo._SHEETS, {"sheet-id": sh}, clear=True):
+            sheets_repo.after_fork()
+        self.assertTrue(client.session.closed)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+"""
+LRU-cache för restid/avstånd per (origin, destination) med TTL.
+Nycklarna är samma API-parametrar som get_travel_details() får
+('place_id:…' eller 'lat,lng'), så varje normaliserat par cachas en gång.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class TravelCache:
+    """
+    Trådsäker LRU: get() ger bara färska värden, get_stale() även utgångna
+    (senast kända värde när Google inte svarar), put() trycker ut äldst använda.
+    """
+
+    def __init__(self, maxsize=5000, ttl_s=24 * 3600):
+        self.maxsize = int(maxsize)
+        self.ttl_s = float(ttl_s)
+        self._data = OrderedDict()  # key → (duration_min, distance_km, sparad_ts)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, now=None):
+        """(duration_min, distance_km) om värdet finns och är yngre än TTL, annars None."""
+        now = time.time() if now is None else now
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None or now - hit[2] > self.ttl_s:
+                return None
+            self._data.move_to_end(key)
+            return hit[0], hit[1]
+
+    def get_stale(self, key, now=None):
+        """Senast kända värde oavsett TTL → (duration_min, distance_km, ålder_s), annars None."""
+        now = time.time() if now is None else now
+        with self._lock:
+            hit = self._data.get(key)
+        if hit is None:
+            return None
+        return hit[0], hit[1], max(now - hit[2], 0.0)
+
+    def put(self, key, duration, distance, ts=None):
+        """Spara ett värde; ts (t.ex. från journalen) behåller ursprunglig ålder."""
+        if not duration or not distance or self.maxsize <= 0:
+            return
+        ts = time.time() if ts is None else float(ts)
+        with self._lock:
+            old = self._data.get(key)
+            if old is not None and old[2] > ts:
+                return
+            self._data[key] = (duration, distance, ts)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()